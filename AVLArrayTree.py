@@ -0,0 +1,614 @@
+"""An array-backed AVL tree.
+
+Nodes are integer handles into parallel columns (keys, values, left, right,
+parent, height and subtree size) instead of AVLNode objects. Handle 0 is the
+virtual leaf. Trees produced by split share their parent's store, so they can be
+joined again without copying.
+"""
+
+from array import array
+
+NIL = 0 # the virtual leaf handle, handles are 32-bit ints ("i" columns)
+
+"""A class holding the columns of one or more array-backed AVL trees"""
+
+class AVLArrayStore(object):
+	"""Constructor, slot 0 is reserved for the virtual leaf
+	"""
+	def __init__(self):
+		self.keys = [None]
+		self.values = [None]
+		self.left = array("i", [NIL])
+		self.right = array("i", [NIL])
+		self.parent = array("i", [NIL])
+		self.height = array("b", [-1])
+		self.size = array("i", [0])
+		self.free = [] # handles of deleted slots
+
+	"""allocates a slot for a new leaf, reusing a deleted slot if there is one
+
+	@rtype: int
+	@returns: the handle of the new node
+	"""
+	def alloc(self, key, val):
+		if self.free:
+			h = self.free.pop()
+			self.keys[h] = key
+			self.values[h] = val
+			self.left[h] = NIL
+			self.right[h] = NIL
+			self.parent[h] = NIL
+			self.height[h] = 0
+			self.size[h] = 1
+			return h
+		self.keys.append(key)
+		self.values.append(val)
+		self.left.append(NIL)
+		self.right.append(NIL)
+		self.parent.append(NIL)
+		self.height.append(0)
+		self.size.append(1)
+		return len(self.keys) - 1
+
+	"""returns a slot to the free list and drops its key and value
+	"""
+	def release(self, h):
+		self.keys[h] = None
+		self.values[h] = None
+		self.free.append(h)
+
+	"""returns a copy of the store, one buffer copy per column
+
+	@rtype: AVLArrayStore
+	"""
+	def copy(self):
+		other = AVLArrayStore.__new__(AVLArrayStore)
+		other.keys = self.keys.copy()
+		other.values = self.values.copy()
+		other.left = array("i", self.left)
+		other.right = array("i", self.right)
+		other.parent = array("i", self.parent)
+		other.height = array("b", self.height)
+		other.size = array("i", self.size)
+		other.free = self.free.copy()
+		return other
+
+	"""returns the number of bytes held by the columns (keys and values excluded)
+
+	@rtype: int
+	"""
+	def nbytes(self):
+		total = 0
+		for col in (self.left, self.right, self.parent, self.height, self.size):
+			total += col.itemsize * len(col)
+		# the key and value lists hold one pointer per slot
+		total += 2 * 8 * len(self.keys)
+		return total
+
+"""
+A class implementing an AVL tree on top of an AVLArrayStore.
+Nodes are integer handles, None stands for "no node" in return values.
+"""
+
+class AVLArrayTree(object):
+
+	"""
+	Constructor
+
+	@type store: AVLArrayStore
+	@param store: the columns to allocate nodes in, a new store if None
+	"""
+	def __init__(self, store=None):
+		self.store = store if store is not None else AVLArrayStore()
+		self.root = NIL
+		self.max = NIL
+		self.min = NIL
+		self.t_size = 0
+
+	"""------------------ help functions ------------------"""
+
+	"""returns the number of items in dictionary
+
+	@rtype: int
+	"""
+	def size(self):
+		return self.t_size
+
+	"""returns the key of a node
+
+	@type h: int
+	@pre: h is a node in self
+	"""
+	def key(self, h):
+		return self.store.keys[h]
+
+	"""returns the value of a node
+
+	@type h: int
+	@pre: h is a node in self
+	"""
+	def value(self, h):
+		return self.store.values[h]
+
+	"""returns the root handle, None if the dictionary is empty
+
+	@rtype: int
+	"""
+	def get_root(self):
+		return self.root if self.root != NIL else None
+
+	"""returns the handle with the maximal key, None if the dictionary is empty
+
+	@rtype: int
+	"""
+	def max_node(self):
+		return self.max if self.max != NIL else None
+
+	"""returns the handle with the minimal key, None if the dictionary is empty
+
+	@rtype: int
+	"""
+	def min_node(self):
+		return self.min if self.min != NIL else None
+
+	def _min_of(self, h):
+		left = self.store.left
+		while left[h] != NIL:
+			h = left[h]
+		return h
+
+	def _max_of(self, h):
+		right = self.store.right
+		while right[h] != NIL:
+			h = right[h]
+		return h
+
+	"""returns the successor of a node, None if it is the max
+
+	@type h: int
+	@rtype: int
+	"""
+	def successor(self, h):
+		st = self.store
+		if st.right[h] != NIL:
+			return self._min_of(st.right[h])
+		p = st.parent[h]
+		while p != NIL and st.right[p] == h:
+			h = p
+			p = st.parent[h]
+		return p if p != NIL else None
+
+	"""returns a copy of the tree, the columns are copied as whole buffers
+
+	@rtype: AVLArrayTree
+	"""
+	def copy(self):
+		tree = AVLArrayTree(self.store.copy())
+		tree.root = self.root
+		tree.max = self.max
+		tree.min = self.min
+		tree.t_size = self.t_size
+		return tree
+
+	"""returns a report of the memory held by the tree's columns (keys and values excluded)
+
+	@rtype: dict
+	"""
+	def memory_usage(self):
+		node_bytes = self.store.nbytes()
+		return {"nodes": self.t_size,
+			"slots": len(self.store.keys),
+			"node_bytes": node_bytes,
+			"bytes_per_key": node_bytes / self.t_size if self.t_size else 0.0}
+
+	"""------------------ rebalances and rotations functions------------------ """
+
+	"""recomputes the height and the subtree size of a real node from its children
+	"""
+	def _update(self, h):
+		st = self.store
+		l = st.left[h]
+		r = st.right[h]
+		hl = st.height[l]
+		hr = st.height[r]
+		st.height[h] = (hl if hl > hr else hr) + 1
+		st.size[h] = st.size[l] + st.size[r] + 1
+
+	def _bf(self, h):
+		st = self.store
+		return st.height[st.left[h]] - st.height[st.right[h]]
+
+	"""makes child take old's place under old's parent
+	"""
+	def _replace_child(self, old, child):
+		st = self.store
+		p = st.parent[old]
+		if child != NIL:
+			st.parent[child] = p
+		if p != NIL:
+			if st.left[p] == old:
+				st.left[p] = child
+			else:
+				st.right[p] = child
+
+	"""rotates h with its right child, returns the new subtree root
+	"""
+	def _rotate_left(self, h):
+		st = self.store
+		r = st.right[h]
+		mid = st.left[r]
+		self._replace_child(h, r)
+		st.right[h] = mid
+		if mid != NIL:
+			st.parent[mid] = h
+		st.left[r] = h
+		st.parent[h] = r
+		self._update(h)
+		self._update(r)
+		return r
+
+	"""rotates h with its left child, returns the new subtree root
+	"""
+	def _rotate_right(self, h):
+		st = self.store
+		l = st.left[h]
+		mid = st.right[l]
+		self._replace_child(h, l)
+		st.left[h] = mid
+		if mid != NIL:
+			st.parent[mid] = h
+		st.right[l] = h
+		st.parent[h] = l
+		self._update(h)
+		self._update(l)
+		return l
+
+	"""restores the AVL property at h after its children changed, returns the new subtree root
+	"""
+	def _rebalance(self, h):
+		st = self.store
+		self._update(h)
+		bf = self._bf(h)
+		if bf > 1:
+			if self._bf(st.left[h]) < 0:
+				self._rotate_left(st.left[h])
+			return self._rotate_right(h)
+		if bf < -1:
+			if self._bf(st.right[h]) > 0:
+				self._rotate_right(st.right[h])
+			return self._rotate_left(h)
+		return h
+
+	"""rebalances every node from h up to the top of its tree
+
+	@rtype: int
+	@returns: the top of the tree
+	"""
+	def _fix_up(self, h):
+		parent = self.store.parent
+		top = h
+		while h != NIL:
+			top = self._rebalance(h)
+			h = parent[top]
+		return top
+
+	"""------------------ main functions ------------------"""
+
+	"""searches for a node in the dictionary corresponding to the key (starting at the root)
+
+	@rtype: (int,int)
+	@returns: a tuple (x,e) where x is the handle of key (or None if not found),
+	and e is the number of edges on the path between the starting node and ending node+1.
+	"""
+	def search(self, key):
+		st = self.store
+		h = self.root
+		edges = 1
+		while h != NIL:
+			k = st.keys[h]
+			if k == key:
+				return h, edges
+			h = st.left[h] if key < k else st.right[h]
+			edges += 1
+		return None, -1
+
+	"""links a new leaf under parent and rebalances, counting promotes like AVLTree
+	"""
+	def _attach(self, new, parent, key):
+		st = self.store
+		self.t_size += 1
+		if parent == NIL:
+			self.root = new
+			self.max = new
+			self.min = new
+			return 1
+		st.parent[new] = parent
+		if key < st.keys[parent]:
+			st.left[parent] = new
+		else:
+			st.right[parent] = new
+		if self.max == NIL or key >= st.keys[self.max]:
+			self.max = new
+		elif key < st.keys[self.min]:
+			self.min = new
+		# the new leaf adds one to every ancestor's size
+		p = parent
+		while p != NIL:
+			st.size[p] += 1
+			p = st.parent[p]
+		promotes = 0
+		node = new
+		while True:
+			p = st.parent[node]
+			if p == NIL:
+				return promotes + 1
+			bf = self._bf(p)
+			if bf == 0:
+				return promotes
+			if bf == 1 or bf == -1:
+				promotes += 1
+				self._update(p)
+				node = p
+				continue
+			top = self._rebalance(p)
+			if st.parent[top] == NIL:
+				self.root = top
+			return promotes
+
+	"""inserts a new node into the dictionary with corresponding key and value (starting at the root)
+
+	@pre: key currently does not appear in the dictionary
+	@rtype: (int,int,int)
+	@returns: a 3-tuple (x,e,h) where x is the new handle,
+	e is the number of edges on the path between the starting node and new node before rebalancing,
+	and h is the number of PROMOTE cases during the AVL rebalancing
+	"""
+	def insert(self, key, val):
+		st = self.store
+		new = st.alloc(key, val)
+		parent = NIL
+		h = self.root
+		edges = 0
+		while h != NIL:
+			edges += 1
+			parent = h
+			h = st.left[h] if key < st.keys[h] else st.right[h]
+		return (new, edges, self._attach(new, parent, key))
+
+	"""inserts a new node into the dictionary with corresponding key and value, starting at the max or the min
+
+	@pre: key currently does not appear in the dictionary
+	@rtype: (int,int,int)
+	@returns: a 3-tuple (x,e,h) as in insert
+	"""
+	def finger_insert(self, key, val):
+		st = self.store
+		new = st.alloc(key, val)
+		h = self.max
+		if h == NIL:
+			return (new, 0, self._attach(new, NIL, key))
+		# climb from both ends in lockstep, the first to reach an ancestor whose sub-tree holds key wins
+		lo = self.min
+		edges = 0
+		while True:
+			p = st.parent[h]
+			if p == NIL or st.keys[p] < key:
+				break
+			p = st.parent[lo]
+			if p == NIL or st.keys[p] > key:
+				h = lo
+				break
+			h = st.parent[h]
+			lo = p
+			edges += 1
+		parent = h
+		while h != NIL:
+			edges += 1
+			parent = h
+			h = st.right[h] if key > st.keys[h] else st.left[h]
+		return (new, edges, self._attach(new, parent, key))
+
+	"""deletes node from the dictionary
+
+	@type h: int
+	@pre: h is a real handle of a node in self
+	"""
+	def delete(self, h):
+		st = self.store
+		self.t_size -= 1
+		was_max = h == self.max
+		if h == self.min:
+			self.min = self.successor(h) if self.t_size else NIL
+		if st.left[h] == NIL or st.right[h] == NIL:
+			child = st.left[h] if st.left[h] != NIL else st.right[h]
+			start = st.parent[h]
+			self._replace_child(h, child)
+			if start == NIL:
+				self.root = child
+		else:
+			# the successor takes h's place
+			y = self._min_of(st.right[h])
+			if st.parent[y] != h:
+				start = st.parent[y]
+				self._replace_child(y, st.right[y])
+				st.right[y] = st.right[h]
+				st.parent[st.right[y]] = y
+			else:
+				start = y
+			self._replace_child(h, y)
+			if st.parent[y] == NIL:
+				self.root = y
+			st.left[y] = st.left[h]
+			st.parent[st.left[y]] = y
+		if start != NIL:
+			self.root = self._fix_up(start)
+		st.release(h)
+		if was_max:
+			self.max = self._max_of(self.root) if self.root != NIL else NIL
+
+	"""joins the subtrees a < x < b with the detached node x, returns the new top
+	"""
+	def _join_roots(self, a, x, b):
+		st = self.store
+		ha = st.height[a]
+		hb = st.height[b]
+		if ha > hb + 1:
+			# walk down a's right spine to a subtree as high as b
+			c = a
+			while st.height[c] > hb + 1:
+				cp = c
+				c = st.right[c]
+			st.left[x] = c
+			st.right[x] = b
+			if c != NIL:
+				st.parent[c] = x
+			if b != NIL:
+				st.parent[b] = x
+			st.parent[x] = cp
+			st.right[cp] = x
+			return self._fix_up(x)
+		if hb > ha + 1:
+			c = b
+			while st.height[c] > ha + 1:
+				cp = c
+				c = st.left[c]
+			st.right[x] = c
+			st.left[x] = a
+			if c != NIL:
+				st.parent[c] = x
+			if a != NIL:
+				st.parent[a] = x
+			st.parent[x] = cp
+			st.left[cp] = x
+			return self._fix_up(x)
+		st.left[x] = a
+		st.right[x] = b
+		if a != NIL:
+			st.parent[a] = x
+		if b != NIL:
+			st.parent[b] = x
+		st.parent[x] = NIL
+		self._update(x)
+		return x
+
+	"""copies the nodes of a tree living in another store into self.store
+
+	@rtype: int
+	@returns: the root handle of the copy
+	"""
+	def _adopt(self, tree):
+		if tree.root == NIL:
+			return NIL
+		src = tree.store
+		st = self.store
+		new_root = st.alloc(src.keys[tree.root], src.values[tree.root])
+		stack = [(tree.root, new_root)]
+		while stack:
+			s, d = stack.pop()
+			st.height[d] = src.height[s]
+			st.size[d] = src.size[s]
+			for side, col in ((src.left, st.left), (src.right, st.right)):
+				c = side[s]
+				if c != NIL:
+					dc = st.alloc(src.keys[c], src.values[c])
+					col[d] = dc
+					st.parent[dc] = d
+					stack.append((c, dc))
+		return new_root
+
+	"""joins self with item and another AVLArrayTree
+
+	@type tree2: AVLArrayTree
+	@param tree2: a dictionary to be joined with self, it is empty afterwards
+	@pre: all keys in self are smaller than key and all keys in tree2 are larger than key,
+	or the opposite way
+	"""
+	def join(self, tree2, key, val):
+		st = self.store
+		if tree2.store is st:
+			other = tree2.root
+		else:
+			other = self._adopt(tree2)
+		x = st.alloc(key, val)
+		if (self.root != NIL and st.keys[self.root] < key) or (other != NIL and st.keys[other] > key):
+			a, b = self.root, other
+			right_max = NIL if other == NIL else (tree2.max if tree2.store is st else self._max_of(other))
+		else:
+			a, b = other, self.root
+			right_max = self.max
+		self.root = self._join_roots(a, x, b)
+		self.max = right_max if right_max != NIL else x
+		self.min = self._min_of(self.root)
+		self.t_size = st.size[self.root]
+		tree2.root = NIL
+		tree2.max = NIL
+		tree2.min = NIL
+		tree2.t_size = 0
+
+	"""splits the dictionary at a given node
+
+	@type h: int
+	@pre: h is in self
+	@rtype: (AVLArrayTree, AVLArrayTree)
+	@returns: a tuple (left, right) of the keys smaller and larger than h's key.
+	Both share self's store, self is empty afterwards.
+	"""
+	def split(self, h):
+		st = self.store
+		left_root = st.left[h]
+		right_root = st.right[h]
+		if left_root != NIL:
+			st.parent[left_root] = NIL
+		if right_root != NIL:
+			st.parent[right_root] = NIL
+		node = h
+		p = st.parent[h]
+		while p != NIL:
+			gp = st.parent[p]
+			st.parent[p] = NIL
+			if st.left[p] == node:
+				sibling = st.right[p]
+				if sibling != NIL:
+					st.parent[sibling] = NIL
+				right_root = self._join_roots(right_root, p, sibling)
+			else:
+				sibling = st.left[p]
+				if sibling != NIL:
+					st.parent[sibling] = NIL
+				left_root = self._join_roots(sibling, p, left_root)
+			node = p
+			p = gp
+		t_left = AVLArrayTree(st)
+		t_right = AVLArrayTree(st)
+		for t, r in ((t_left, left_root), (t_right, right_root)):
+			t.root = r
+			t.t_size = st.size[r]
+		t_left.max = self._max_of(left_root) if left_root != NIL else NIL
+		t_right.max = self.max if right_root != NIL else NIL
+		t_left.min = self.min if left_root != NIL else NIL
+		t_right.min = self._min_of(right_root) if right_root != NIL else NIL
+		st.release(h)
+		self.root = NIL
+		self.max = NIL
+		self.min = NIL
+		self.t_size = 0
+		return (t_left, t_right)
+
+	"""returns an array representing dictionary
+
+	@rtype: list
+	@returns: a sorted list according to key of touples (key, value) representing the data structure
+	"""
+	def avl_to_array(self):
+		st = self.store
+		arr = []
+		stack = []
+		h = self.root
+		while stack or h != NIL:
+			while h != NIL:
+				stack.append(h)
+				h = st.left[h]
+			h = stack.pop()
+			arr.append((st.keys[h], st.values[h]))
+			h = st.right[h]
+		return arr
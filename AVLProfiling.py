@@ -0,0 +1,204 @@
+"""Opt-in latency histograms and slow-operation hooks for AVLTree.
+
+instrument(tree) shadows the tree's operation methods with timed wrappers on
+that one instance, uninstrument(tree) removes them again. A tree that was never
+instrumented runs the plain class methods and pays nothing.
+"""
+
+import time
+
+# the operations instrument() wraps unless told otherwise
+DEFAULT_OPS = ("search", "finger_search", "insert", "finger_insert", "delete", "join", "split")
+# operations that empty the tree and return new trees, which are instrumented in turn
+SPLIT_OPS = ("split", "split_key")
+# sub-buckets per power of two, 8 keeps every bucket within 1/8 of its values
+SUB_BUCKET_BITS = 3
+
+"""A latency histogram with log-linear (HDR style) buckets over nanoseconds.
+Values below 2^SUB_BUCKET_BITS ns are counted exactly, above that every power of two
+is split into 2^SUB_BUCKET_BITS equal buckets, so the relative error is bounded
+while the number of buckets only grows with the log of the largest value.
+"""
+
+class LatencyHistogram(object):
+
+	def __init__(self):
+		self.reset()
+
+	"""clears every count"""
+	def reset(self):
+		self.counts = {}
+		self.count = 0
+		self.total = 0
+		self.max = 0
+		self.min = None
+
+	"""returns the bucket of a value in ns
+
+	@rtype: int
+	"""
+	@staticmethod
+	def bucket_of(ns):
+		shift = ns.bit_length() - SUB_BUCKET_BITS - 1
+		if shift <= 0:
+			return ns
+		# the top SUB_BUCKET_BITS + 1 bits of ns, tagged with how far they were shifted
+		return (shift << SUB_BUCKET_BITS) + (ns >> shift)
+
+	"""returns the largest value in ns that falls in bucket
+
+	@rtype: int
+	"""
+	@staticmethod
+	def bucket_high(bucket):
+		if bucket < 2 << SUB_BUCKET_BITS:
+			return bucket
+		shift = (bucket >> SUB_BUCKET_BITS) - 1
+		top = bucket - (shift << SUB_BUCKET_BITS)
+		return ((top + 1) << shift) - 1
+
+	"""counts one value
+
+	@type ns: int
+	@param ns: a latency in nanoseconds
+	"""
+	def record(self, ns):
+		bucket = self.bucket_of(ns)
+		self.counts[bucket] = self.counts.get(bucket, 0) + 1
+		self.count += 1
+		self.total += ns
+		if ns > self.max:
+			self.max = ns
+		if self.min is None or ns < self.min:
+			self.min = ns
+
+	"""returns the value in ns at or below which p percent of the values are, within a bucket
+
+	@type p: float
+	@param p: a percentile between 0 and 100
+	@rtype: int
+	"""
+	def percentile(self, p):
+		if self.count == 0:
+			return 0
+		target = max(1, -(-self.count * p // 100))
+		seen = 0
+		for bucket in sorted(self.counts):
+			seen += self.counts[bucket]
+			if seen >= target:
+				return min(self.bucket_high(bucket), self.max)
+		return self.max
+
+	"""adds the counts of another histogram to self"""
+	def merge(self, other):
+		for bucket, c in other.counts.items():
+			self.counts[bucket] = self.counts.get(bucket, 0) + c
+		self.count += other.count
+		self.total += other.total
+		self.max = max(self.max, other.max)
+		if other.min is not None and (self.min is None or other.min < self.min):
+			self.min = other.min
+
+	"""returns a summary in ns
+
+	@rtype: dict
+	"""
+	def snapshot(self):
+		return {"count": self.count, "min": self.min or 0, "max": self.max,
+			"mean": self.total / self.count if self.count else 0,
+			"p50": self.percentile(50), "p90": self.percentile(90),
+			"p99": self.percentile(99), "p999": self.percentile(99.9)}
+
+"""The instrumentation state of one tree, returned by instrument()"""
+
+class Instrumentation(object):
+
+	def __init__(self, ops, slow_ns, on_slow, profiler, sample_every):
+		self.ops = ops
+		self.histograms = {op: LatencyHistogram() for op in ops}
+		self.slow_ns = slow_ns
+		self.on_slow = on_slow
+		self.profiler = profiler
+		self.sample_every = sample_every
+		self.calls = 0
+
+	"""returns the summaries of every operation's histogram
+
+	@rtype: dict
+	"""
+	def snapshot(self):
+		return {op: h.snapshot() for op, h in self.histograms.items()}
+
+	"""clears every histogram"""
+	def reset(self):
+		for h in self.histograms.values():
+			h.reset()
+
+	"""shadows the operation methods of tree with timed wrappers sharing self's histograms"""
+	def attach(self, tree):
+		for op in self.ops:
+			# an instance attribute shadows the class method for this tree only
+			setattr(tree, op, self.wrap(op, getattr(tree, op)))
+		tree.instrumentation = self
+
+	"""returns a timed version of the bound method method, named op"""
+	def wrap(self, op, method):
+		histogram = self.histograms[op]
+		clock = time.perf_counter_ns
+		def timed(*args, **kwargs):
+			self.calls += 1
+			profiler = self.profiler
+			if profiler is not None and self.calls % self.sample_every == 0:
+				profiler.enable()
+				start = clock()
+				try:
+					result = method(*args, **kwargs)
+				finally:
+					elapsed = clock() - start
+					profiler.disable()
+			else:
+				start = clock()
+				result = method(*args, **kwargs)
+				elapsed = clock() - start
+			histogram.record(elapsed)
+			if op in SPLIT_OPS:
+				# the items live on in the halves, so their operations are timed as well;
+				# split returns (left, right), split_key (left, node, right)
+				self.attach(result[0])
+				self.attach(result[-1])
+			if self.on_slow is not None and elapsed >= self.slow_ns:
+				self.on_slow(op, elapsed, args, kwargs)
+			return result
+		timed.__name__ = op
+		timed.__doc__ = method.__doc__
+		return timed
+
+"""------------------ main functions ------------------"""
+
+"""starts timing the operations of one tree
+
+@type tree: AVLTree
+@type ops: tuple
+@param ops: names of the methods to time
+@type slow_ms: float
+@param slow_ms: calls taking at least this long are passed to on_slow
+@param on_slow: None, or a function (op, elapsed_ns, args, kwargs) called after every slow call
+@param profiler: None, or an object with enable() and disable(), such as a
+cProfile.Profile, that is run around one call in every sample_every
+@rtype: Instrumentation
+@returns: the histograms and settings, also kept as tree.instrumentation;
+the trees a split returns are instrumented with the same one
+"""
+def instrument(tree, ops=DEFAULT_OPS, slow_ms=10.0, on_slow=None, profiler=None, sample_every=1000):
+	uninstrument(tree)
+	inst = Instrumentation(tuple(ops), int(slow_ms * 1e6), on_slow, profiler, sample_every)
+	inst.attach(tree)
+	return inst
+
+"""stops timing a tree, returning its Instrumentation (None if it was not instrumented)"""
+def uninstrument(tree):
+	inst = tree.__dict__.pop("instrumentation", None)
+	if inst is not None:
+		for op in inst.ops:
+			tree.__dict__.pop(op, None)
+	return inst
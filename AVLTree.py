@@ -5,9 +5,36 @@
 #name2: Itai Ben Shahar
 #username2: itaib1
 
+import io
+import itertools
+import pickle
+import struct
+import sys
+
+# a union inserts sub-trees up to this height item by item instead of splitting for them
+UNION_CUTOFF_HEIGHT = 3
+
+# dump format: a header (magic, version, flags, item count) and then frames, each a byte
+# length followed by that many bytes of whole records; a record is a header (key tag, key
+# length, value tag, value length) followed by the key and value bytes. The frames let load
+# read exactly the dump, so a stream can hold more than one.
+DUMP_MAGIC = b"AVLT"
+DUMP_VERSION = 2
+DUMP_HEADER = struct.Struct("<4sBBQ")
+DUMP_FRAME = struct.Struct("<I")
+DUMP_RECORD = struct.Struct("<BIBI")
+DUMP_CHUNK = 1 << 20
+FLAG_SHARED_SENTINEL = 1
+FLAG_SIZE_AUGMENTED = 2
+FLAG_THREADED = 4
+TAG_INT, TAG_STR, TAG_BYTES, TAG_FLOAT, TAG_PICKLE = range(5)
+
 """A class represnting a node in an AVL tree"""
 
 class AVLNode(object):
+	# fixed fields instead of a per-instance __dict__, this is most of a node's memory
+	__slots__ = ("key", "value", "left", "right", "parent", "height")
+
 	"""Constructor, you are allowed to add more fields. 
 	
 	@type key: int
@@ -79,11 +106,128 @@ class AVLNode(object):
 	def to_avl_tree(self):
 		tree = AVLTree()
 		tree.root = self
-		# update max pointer
+		# update max and min pointers
 		tree.update_max()
+		tree.update_min()
 
 		return tree
 
+"""A node of a size augmented tree, keeping the number of real nodes in its sub-tree"""
+
+class AVLSizedNode(AVLNode):
+	__slots__ = ("size",)
+
+	def __init__(self, key, value):
+		AVLNode.__init__(self, key, value)
+		self.size = 0
+
+	"""updates the node's height and sub-tree size
+	@pre: self.is_real_node() == True
+	"""
+	def update_height(self):
+		self.height = max(self.left.height, self.right.height) + 1
+		self.size = self.left.size + self.right.size + 1
+
+"""A node of a threaded tree, linked to its in-order neighbours (None at the ends)"""
+
+class AVLThreadedNode(AVLNode):
+	__slots__ = ("next", "prev")
+
+	def __init__(self, key, value):
+		AVLNode.__init__(self, key, value)
+		self.next = None
+		self.prev = None
+
+"""A node of a threaded, size augmented tree"""
+
+class AVLThreadedSizedNode(AVLSizedNode):
+	__slots__ = ("next", "prev")
+
+	def __init__(self, key, value):
+		AVLSizedNode.__init__(self, key, value)
+		self.next = None
+		self.prev = None
+
+"""returns the node class of a tree in the given mode, nodes only carry the fields their mode uses"""
+def node_class_for(size_augmented, threaded):
+	if threaded:
+		return AVLThreadedSizedNode if size_augmented else AVLThreadedNode
+	return AVLSizedNode if size_augmented else AVLNode
+
+"""A shared, immutable virtual leaf.
+One instance per tree stands in for every virtual child, so a real node costs a
+single object instead of three. Writes to parent are dropped (a shared leaf has
+no single parent), any other write is an error.
+"""
+
+class AVLVirtualNode(AVLSizedNode):
+	__slots__ = ()
+
+	def __init__(self):
+		object.__setattr__(self, "key", None)
+		object.__setattr__(self, "value", None)
+		object.__setattr__(self, "left", None)
+		object.__setattr__(self, "right", None)
+		object.__setattr__(self, "parent", None)
+		object.__setattr__(self, "height", -1)
+		object.__setattr__(self, "size", 0)
+
+	def __setattr__(self, name, value):
+		if name == "parent":
+			return
+		raise AttributeError("the shared virtual node is immutable")
+
+"""Counters of the work done by a tree, see AVLTree.enable_stats.
+comparisons counts key comparisons (one three-way comparison per node a descent or a
+finger climb passes), nodes_visited adds the nodes walked by rebalancing, and every
+rotation kind is counted under the name of the method performing it.
+"""
+
+class AVLStats(object):
+	FIELDS = ("searches", "inserts", "deletes", "joins", "splits",
+		"comparisons", "nodes_visited", "promotes",
+		"single_rotation_right_ins", "single_rotation_left_ins",
+		"double_rotation_right_ins", "double_rotation_left_ins",
+		"single_rotation_left_del", "single_rotation_right_del",
+		"double_rotation_left_del", "double_rotation_right_del")
+	__slots__ = FIELDS
+
+	def __init__(self):
+		self.reset()
+
+	"""sets every counter to 0"""
+	def reset(self):
+		for name in self.FIELDS:
+			setattr(self, name, 0)
+
+	"""counts a search that passed visited nodes"""
+	def record_search(self, visited):
+		self.searches += 1
+		self.comparisons += visited
+		self.nodes_visited += visited
+
+	"""counts an insert whose descent passed visited nodes and whose rebalancing
+	promoted promotes times and walked levels nodes"""
+	def record_insert(self, visited, promotes, levels):
+		self.inserts += 1
+		self.comparisons += visited
+		self.nodes_visited += visited + levels
+		self.promotes += promotes
+
+	"""returns the counters as a dict
+
+	@rtype: dict
+	"""
+	def snapshot(self):
+		return {name: getattr(self, name) for name in self.FIELDS}
+
+	"""returns the total number of rotations, a double rotation counts once
+
+	@rtype: int
+	"""
+	def rotations(self):
+		return sum(getattr(self, name) for name in self.FIELDS if "rotation" in name)
+
 """
 A class implementing an AVL tree.
 """
@@ -92,20 +236,111 @@ class AVLTree(object):
 
 	"""
 	Constructor, you are allowed to add more fields.
+
+	@type shared_sentinel: bool
+	@param shared_sentinel: if True, one immutable AVLVirtualNode stands in for every
+	virtual leaf of the tree, otherwise a fresh node with key None is made per leaf
+	@type size_augmented: bool
+	@param size_augmented: if True, every node keeps the size of its sub-tree, which
+	costs a walk to the root per insert and delete and a field per node, and enables
+	select and rank
+	@type threaded: bool
+	@param threaded: if True, every node links to its in-order neighbours, which makes
+	successor, predecessor and every step of a walk O(1) at two pointers per node
 	"""
-	def __init__(self):
-		self.root = AVLNode(None, None) # sentinel
+	def __init__(self, shared_sentinel=True, size_augmented=False, threaded=False):
+		self.virtual = AVLVirtualNode() if shared_sentinel else None
+		self.augmented = size_augmented
+		self.threaded = threaded
+		self.node_class = node_class_for(size_augmented, threaded)
+		self.root = self.virtual_node() # sentinel
 		self.max = self.root # pointer to node with max key
+		self.min = self.root # pointer to node with min key
 		self.t_size = 0 
+		self.stats = None # an AVLStats while statistics are enabled
+
+	"""builds a perfectly balanced tree from sorted items in O(n), without rebalancing
+
+	@type items: iterable
+	@param items: (key, value) pairs in increasing key order, may be a generator
+	@type n: int
+	@param n: if given, only the first n items are read
+	@pre: the keys are distinct and sorted
+	@rtype: AVLTree
+	"""
+	@classmethod
+	def from_sorted(cls, items, n=None, shared_sentinel=True, size_augmented=False, threaded=False):
+		tree = cls(shared_sentinel, size_augmented, threaded)
+		make = tree.node_class
+		if n is not None:
+			nodes = [make(k, v) for k, v in itertools.islice(items, n)]
+			if len(nodes) < n:
+				raise ValueError("items ended before n pairs were read")
+		else:
+			nodes = [make(k, v) for k, v in items]
+		n = len(nodes)
+		if n == 0:
+			return tree
+		if threaded:
+			for i in range(1, n):
+				nodes[i - 1].next = nodes[i]
+				nodes[i].prev = nodes[i - 1]
+		# the middle of nodes[lo:hi] becomes the sub-tree root, a sub-tree of c nodes
+		# is then exactly c.bit_length() - 1 high, so no heights are computed bottom-up
+		root = nodes[(n - 1) // 2]
+		root.parent = tree.root
+		stack = [(0, n)]
+		while stack:
+			lo, hi = stack.pop()
+			mid = lo + (hi - lo - 1) // 2
+			node = nodes[mid]
+			node.height = (hi - lo).bit_length() - 1
+			if size_augmented:
+				node.size = hi - lo
+			if lo < mid:
+				child = nodes[lo + (mid - lo - 1) // 2]
+				stack.append((lo, mid))
+			else:
+				child = tree.virtual_node()
+			node.left = child
+			child.parent = node
+			if mid + 1 < hi:
+				child = nodes[mid + 1 + (hi - mid - 2) // 2]
+				stack.append((mid + 1, hi))
+			else:
+				child = tree.virtual_node()
+			node.right = child
+			child.parent = node
+		tree.root = root
+		tree.max = nodes[-1]
+		tree.min = nodes[0]
+		tree.t_size = n
+		return tree
 
 	"""------------------ help functions ------------------"""
 
+	"""returns a virtual node to be used as a leaf of the tree
+
+	@rtype: AVLNode
+	@returns: the tree's shared sentinel, or a new virtual node if the tree has none
+	"""
+	def virtual_node(self):
+		if self.virtual is not None:
+			return self.virtual
+		return AVLSizedNode(None, None) if self.augmented else AVLNode(None, None)
+
 	"""returns the number of items in dictionary 
 
 	@rtype: int
 	@returns: the number of items in dictionary 
 	"""
 	def size(self):
+		if self.t_size is None:
+			# the size of a tree cut out by split is counted on first use
+			count = 0
+			for node in self.walk(self.min_node()):
+				count += 1
+			self.t_size = count
 		return self.t_size
 	"""returns the root of the tree representing the dictionary
 
@@ -133,12 +368,10 @@ class AVLTree(object):
 	@returns: the minimal node, None if the dictionary is empty
 	"""
 	def min_node(self):
-		node = self.get_root()
-		if node is None:
+		if self.min.is_real_node():
+			return self.min
+		else:
 			return None
-		while node.left.is_real_node():
-			node = node.left
-		return node
 	"""updates the node with the maximal key in the dictionary 
 	@rtype: AVLNode
 	@returns: -
@@ -151,12 +384,91 @@ class AVLTree(object):
 		while node.right.is_real_node():
 			node = node.right
 		self.max = node
+	"""updates the node with the minimal key in the dictionary 
+	@rtype: AVLNode
+	@returns: -
+	"""
+	def update_min(self):
+		node = self.get_root()
+		if node is None:
+			self.min = self.root
+			return
+		while node.left.is_real_node():
+			node = node.left
+		self.min = node
+
+	"""climbs from the end of the dictionary nearer to key towards it
+	Both ends climb in lockstep and the first one to reach an ancestor whose sub-tree
+	can hold key wins, so the cost is O(log d) with d the distance to the nearer end.
+
+	@pre: the dictionary is not empty
+	@rtype: (AVLNode, int)
+	@returns: the node to descend from and the number of edges climbed
+	"""
+	def finger_start(self, key):
+		hi = self.max
+		lo = self.min
+		climbs = 0
+		while True:
+			# the right spine holds key once the parent is below it, the left spine once above
+			par = hi.parent
+			if not par.is_real_node() or par.key < key:
+				return hi, climbs
+			par = lo.parent
+			if not par.is_real_node() or par.key > key:
+				return lo, climbs
+			hi = hi.parent
+			lo = par
+			climbs += 1
+	"""starts counting operations, see AVLStats; trees split or joined off self share the counters
+
+	@rtype: AVLStats
+	@returns: the counters, kept until disable_stats
+	"""
+	def enable_stats(self):
+		if self.stats is None:
+			self.stats = AVLStats()
+		return self.stats
+
+	"""stops counting, after which the counting costs one attribute check per operation"""
+	def disable_stats(self):
+		self.stats = None
+
+	"""returns a report of the memory held by the tree's nodes (keys and values excluded)
+
+	@rtype: dict
+	@returns: the number of real and virtual nodes, their total size in bytes,
+	and the bytes spent per key
+	"""
+	def memory_usage(self):
+		real = 0
+		virtual = set()
+		node_bytes = 0
+		stack = [self.root]
+		while stack:
+			node = stack.pop()
+			if not node.is_real_node():
+				if id(node) not in virtual:
+					virtual.add(id(node))
+					node_bytes += sys.getsizeof(node)
+				continue
+			real += 1
+			node_bytes += sys.getsizeof(node)
+			stack.append(node.left)
+			stack.append(node.right)
+		return {"nodes": real,
+			"virtual_nodes": len(virtual),
+			"node_bytes": node_bytes,
+			"bytes_per_key": node_bytes / real if real else 0.0}
+
 	"""returns the successor of a given node in the dictionary
 
 	@rtype: AVLNode
 	@returns: the successor of node, None if node is the max
 	"""
 	def successor(self,node):
+		if self.threaded:
+			return node.next
 		## edge case - node is max
 		if node == self.max:
 			return None     
@@ -171,44 +483,135 @@ class AVLTree(object):
 				node = node.parent
 			return node.parent if node.parent.is_real_node() else None
 	
+	"""returns the predecessor of a given node
+
+	@type node: AVLNode
+	@rtype: AVLNode
+	@returns: the predecessor of node, None if there is none
+	"""
+	def predecessor(self, node):
+		if self.threaded:
+			return node.prev
+		if node.left.is_real_node():
+			node = node.left
+			while node.right.is_real_node():
+				node = node.right
+			return node
+		## node is a left child
+		while node.parent.is_real_node() and node.parent.left == node:
+			node = node.parent
+		return node.parent if node.parent.is_real_node() else None
+
+	"""links a node between its in-order neighbours in a threaded tree
+
+	@param prev: the node before it, None if it is the new min
+	@param nxt: the node after it, None if it is the new max
+	"""
+	def link(self, node, prev, nxt):
+		node.prev = prev
+		node.next = nxt
+		if prev is not None:
+			prev.next = node
+		if nxt is not None:
+			nxt.prev = node
+
+	"""recomputes the sub-tree sizes from node up to the root
+
+	@type node: AVLNode
+	@param node: the lowest node whose sub-tree changed, may be virtual
+	"""
+	def update_sizes(self, node):
+		while node is not None and node.is_real_node():
+			node.size = node.left.size + node.right.size + 1
+			node = node.parent
+
+	"""returns the node with the smallest key above key (or equal to it, if inclusive)
+
+	@rtype: AVLNode
+	@returns: the node, None if there is none
+	"""
+	def ceiling_node(self, key, inclusive=True):
+		node = self.root
+		best = None
+		while node.is_real_node():
+			if key < node.key or (inclusive and key == node.key):
+				best = node
+				node = node.left
+			else:
+				node = node.right
+		return best
+
+	"""returns the node with the largest key below key (or equal to it, if inclusive)
+
+	@rtype: AVLNode
+	@returns: the node, None if there is none
+	"""
+	def floor_node(self, key, inclusive=True):
+		node = self.root
+		best = None
+		while node.is_real_node():
+			if node.key < key or (inclusive and key == node.key):
+				best = node
+				node = node.right
+			else:
+				node = node.left
+		return best
+
 	"""------------------ rebalances and rotations functions------------------ """
 
 	"""rebalancing the tree after inserting a new node so it maintain the AVLTree properties
+	climbs from node while heights grow and stops at the first level that keeps its height
     @type node: AVLNode
-    @rtype: int
-    @returns: an int indicating the number of promotes
+    @rtype: (int, int)
+    @returns: the number of promotes and the number of nodes the climb walked
     """
 	def rebalance_insertion(self, node):
-		node.update_height()
-        # if it's the root
-		if node is self.get_root():
-			return 1
-		bf = node.parent.balance_factor()
-		if bf == 0: # both children are a single step from the father
-			return 0
-		if abs(bf) == 1:
-			return self.rebalance_insertion(node.parent) + 1
-		else: # abs(bf) == 2 so we rotate
+		promotes = 0
+		levels = 0
+		root = self.root
+		while True:
+			levels += 1
+			# update_height and balance_factor inlined, this loop is the insert hot path
+			lh = node.left.height
+			rh = node.right.height
+			node.height = (lh if lh > rh else rh) + 1
+			# if it's the root
+			if node is root:
+				return promotes + 1, levels
+			par = node.parent
+			bf = par.left.height - par.right.height # par has node as a child, so it is not a leaf
+			if bf == 0: # both children are a single step from the father
+				return promotes, levels
+			if bf == 1 or bf == -1:
+				promotes += 1
+				node = par
+				continue
+			# abs(bf) == 2 so we rotate
 			curr_bf = node.balance_factor()
 			# determine the type of rotation needed according to the balance factors
 			if bf == 2:
-				if curr_bf > 0:
+				if curr_bf >= 0:
 					self.single_rotation_right_ins(node) 
 				else:
 					self.double_rotation_right_ins(node) 
 			else:
-				if curr_bf < 0: 
+				if curr_bf <= 0: 
 					self.single_rotation_left_ins(node) 
 				else:
 					self.double_rotation_left_ins(node)
-				return 0
-		return 0
+			if curr_bf != 0:
+				return promotes, levels
+			# only join leaves a balanced child under an unbalanced parent,
+			# the rotated sub-tree may still be higher so keep climbing from its new root
+			root = self.root
 	
 	"""rotates the sub-tree a single rotation right to keep form of an AVLtree
     @type node: AVLNode
     @returns: None
     """
 	def single_rotation_right_ins(self, node):
+		if self.stats is not None:
+			self.stats.single_rotation_right_ins += 1
 		## save pointers
 		son = node.right
 		old_par = node.parent
@@ -235,6 +638,8 @@ class AVLTree(object):
     @returns: None
     """
 	def single_rotation_left_ins(self, node):
+		if self.stats is not None:
+			self.stats.single_rotation_left_ins += 1
 		## save pointers
 		son = node.left
 		old_par = node.parent
@@ -260,6 +665,8 @@ class AVLTree(object):
     @returns: None
     """
 	def double_rotation_right_ins(self, node):
+		if self.stats is not None:
+			self.stats.double_rotation_right_ins += 1
 		#change pointers
 		old_par = node.parent
 		new_grandpar = node.right
@@ -295,6 +702,8 @@ class AVLTree(object):
     @returns: None
     """
 	def double_rotation_left_ins(self, node):
+		if self.stats is not None:
+			self.stats.double_rotation_left_ins += 1
 		# change pointers
 		old_par = node.parent
 		new_grandpar = node.left
@@ -327,48 +736,42 @@ class AVLTree(object):
 			new_grandpar.parent.left = new_grandpar
     
 	"""rebalancing the the tree after deletion a node so it maintain the AVLTree properties
+	climbs from node and stops at the first level whose height did not change
     @type node: AVLNode
     """
 	def rebalance_deletion(self, node):
-		# edge case of empty tree
-		if node is self.get_root() or not node.is_real_node():
-			return
-		dif = node.height_dif()
-		## if the node is balanced
-		if (dif == (2, 1)) or (dif==(1, 2)): ## balanced
-			return 
-		elif dif == (2, 2): ## up to parent
-			node.update_height()
-			self.rebalance_deletion(node.parent)
-			return
-		# determine the type of rotation needed according to the balance factors
-		if dif == (3, 1):
-			child_dif = node.right.height_dif() 
-			if child_dif == (1, 1): ## R and L - same hight
-				self.single_rotation_left_del(node)
-			elif child_dif == (2, 1): 
-				self.single_rotation_left_del(node)
-				self.rebalance_deletion(node.parent.parent)
-			else: # child_dif == (1, 2)
-				self.double_rotation_left_del(node)
-				self.rebalance_deletion(node.parent.parent)
-		else: # dif == (1, 3)
-			child_dif = node.left.height_dif()
-			if child_dif == (1, 1):
-				self.single_rotation_right_del(node)
-			elif child_dif == (1, 2):
-				self.single_rotation_right_del(node)
-				self.rebalance_deletion(node.parent.parent)
-			else: # child_dif == (2, 1)
-				self.double_rotation_right_del(node)
-				self.rebalance_deletion(node.parent.parent)
-		return 		
+		levels = 0
+		while node.is_real_node():
+			levels += 1
+			old_height = node.height
+			bf = node.left.height - node.right.height
+			# determine the type of rotation needed according to the balance factors
+			if bf == -2:
+				if node.right.balance_factor() <= 0:
+					self.single_rotation_left_del(node)
+				else:
+					self.double_rotation_left_del(node)
+				node = node.parent # the sub-tree's new root
+			elif bf == 2:
+				if node.left.balance_factor() >= 0:
+					self.single_rotation_right_del(node)
+				else:
+					self.double_rotation_right_del(node)
+				node = node.parent
+			else:
+				node.update_height()
+			if node.height == old_height:
+				return levels
+			node = node.parent
+		return levels
 			
 	"""rotates the sub-tree a single rotation left to keep form of an AVLtree
     @type node: AVLNode
     @returns: None
     """
 	def single_rotation_left_del(self, node):
+		if self.stats is not None:
+			self.stats.single_rotation_left_del += 1
 		# establish pointers
 		right_child = node.right
 		left_grandchild = right_child.left
@@ -395,6 +798,8 @@ class AVLTree(object):
 	@returns: None
 	"""
 	def single_rotation_right_del(self, node):
+		if self.stats is not None:
+			self.stats.single_rotation_right_del += 1
 		# establish pointers
 		left_child = node.left
 		right_grandchild = left_child.right
@@ -421,6 +826,8 @@ class AVLTree(object):
 	@returns: None
 	"""
 	def double_rotation_left_del(self, node):
+		if self.stats is not None:
+			self.stats.double_rotation_left_del += 1
 		# establish pointers
 		right_child = node.right
 		new_root = right_child.left
@@ -454,6 +861,8 @@ class AVLTree(object):
 	@returns: None
 	"""
 	def double_rotation_right_del(self, node):
+		if self.stats is not None:
+			self.stats.double_rotation_right_del += 1
 		# establish pointers
 		left_child = node.left
 		new_root = left_child.right
@@ -495,19 +904,24 @@ class AVLTree(object):
 	and e is the number of edges on the path between the starting node and ending node+1.
 	"""
 	def search(self, key):
-		node = self.get_root()
+		node = self.root
 		edges = 1
 		while node.is_real_node():
 			if node.key == key:
+				if self.stats is not None:
+					self.stats.record_search(edges)
 				return node, edges
 			elif key < node.key:
-				node = node.left if node.left.is_real_node() else AVLNode(None, None)
+				node = node.left
 			else:
-				node = node.right if node.right.is_real_node() else AVLNode(None, None)
+				node = node.right
 			edges += 1
+		if self.stats is not None:
+			self.stats.record_search(edges - 1)
 		return None, -1
 
-	"""searches for a node in the dictionary corresponding to the key, starting at the max
+	"""searches for a node in the dictionary corresponding to the key, starting at the max or the min,
+	whichever is closer to the key
         
 	@type key: int
 	@param key: a key to be searched
@@ -517,23 +931,80 @@ class AVLTree(object):
 	"""
 	def finger_search(self, key):
 		node = self.max_node()
-		edges = 0
 		if node is None or node.key < key:
 			return None
-		##up the tree
-		while node.parent is not None and node.parent.is_real_node() and node.key > node.parent.key:
-			node = node.parent
+		node, edges = self.finger_start(key)
+		while node.is_real_node():
 			edges += 1
+			if node.key == key:
+				break
+			node = node.left if key < node.key else node.right
+		if self.stats is not None:
+			self.stats.record_search(edges)
+		if not node.is_real_node():
+			return None, -1
+		return node, edges
 
-		t = node.to_avl_tree()
-		if t.root.key == self.root.key:
-			t = self
-		ans = t.search(key)
+	"""searches for key starting at node, climbing only as far as the key requires
+	The climb passes the ancestors that lie between node and the key in key order and
+	stops at the first one beyond the key. The descent then starts at the lowest climbed
+	node whose sub-tree can hold the key, so a key next to node costs O(1) amortized.
 
-		if ans == (None, 0):
-			return None
-		else:
-			return (ans[0], ans[1] + edges)
+	@type node: AVLNode
+	@param node: a real node of the tree to start from
+	@rtype: (AVLNode, AVLNode, int)
+	@returns: the node of key (None if not found), the node with the smallest key >= key
+	(None if there is none), and the number of nodes visited
+	"""
+	def seek_from(self, node, key):
+		edges = 0
+		ceiling = None
+		low = node # the lowest climbed node whose key range can hold key
+		if key > node.key:
+			par = node.parent
+			while par.is_real_node():
+				if par.left is node:
+					# par bounds node's sub-tree from above
+					if par.key > key:
+						ceiling = par
+						break
+					low = par
+				node = par
+				par = node.parent
+				edges += 1
+		elif key < node.key:
+			par = node.parent
+			while par.is_real_node():
+				if par.right is node:
+					if par.key < key:
+						break
+					low = par
+				node = par
+				par = node.parent
+				edges += 1
+		node = low
+		while node.is_real_node():
+			edges += 1
+			if node.key == key:
+				return node, node, edges
+			if key < node.key:
+				ceiling = node
+				node = node.left
+			else:
+				node = node.right
+		return None, ceiling, edges
+
+	"""returns a cursor over the dictionary
+
+	@param key: None to start at the minimum, otherwise the cursor is placed
+	at the smallest key >= key
+	@rtype: AVLCursor
+	"""
+	def cursor(self, key=None):
+		cur = AVLCursor(self, self.min_node())
+		if key is not None:
+			cur.seek(key)
+		return cur
 
 	"""inserts a new node into the dictionary with corresponding key and value (starting at the root)
 
@@ -548,43 +1019,20 @@ class AVLTree(object):
 	and h is the number of PROMOTE cases during the AVL rebalancing
 	"""
 	def insert(self, key, val):
-		## update size && create new node
-		self.t_size += 1
-		new_n = AVLNode(key, val)
-		new_n.left = AVLNode(None, None)
-		new_n.right = AVLNode(None, None)
-		new_n.left.parent = new_n
-		new_n.right.parent = new_n
-		new_n.update_height()
-		rt = self.get_root()
-		## empty tree case
-		if rt is None:
-			self.root = new_n
-			self.max = new_n
-			return (new_n, 0, 1)
-
-		## insetion
-		curr = rt
+		## descent - remember the last real node, virtual leaves have no parent
+		curr = None
+		nxt = self.root
 		edges = 0
-		while curr.is_real_node():
+		while nxt.is_real_node():
 			edges += 1
-			curr = curr.left if key < curr.key else curr.right
-		curr = curr.parent ## one step back
-		new_n.parent = curr
-		if key < curr.key:
-			curr.left = new_n
-		else:
-			curr.right = new_n
-
-		## update max
-		if self.max_node() == None or new_n.key >= self.max.key: 
-			self.max = new_n
-		## rebalance
-		promote_count = self.rebalance_insertion(new_n) ############ should be  "new_n.parent?"    
-
+			curr = nxt
+			nxt = curr.left if key < curr.key else curr.right
+		new_n, promote_count, levels = self.add_leaf(curr, key, val)
+		if self.stats is not None:
+			self.stats.record_insert(edges, promote_count, levels)
 		return (new_n, edges, promote_count)
 		
-	"""inserts a new node into the dictionary with corresponding key and value, starting at the max
+	"""inserts a new node into the dictionary with corresponding key and value, starting at the max or the min
 
 	@type key: int
 	@pre: key currently does not appear in the dictionary
@@ -597,49 +1045,69 @@ class AVLTree(object):
 	and h is the number of PROMOTE cases during the AVL rebalancing
 	"""
 	def finger_insert(self, key, val):
-		# increase the tree's size by 1
-		self.t_size += 1
-		# initial the new node
-		new_node = AVLNode(key, val)
-		new_node.left = AVLNode(None, None)
-		new_node.left.parent = new_node
-		new_node.right = AVLNode(None, None)
-		new_node.right.parent = new_node
-		new_node.update_height()
-		node = self.max
 		# edge case of empty tree
-		if not node.is_real_node(): # empty tree
-			new_node.parent = self.root
-			self.root = new_node
-			self.max = new_node
-			return (new_node, 0, 1)
-		# find insertion point
-		path_count = 0      
-		# climb to the left towards target node's deepest ancestor
-		while node.parent.is_real_node() and node.parent.key > key: 
-			node = node.parent
-			path_count += 1
-		while node.is_real_node():
+		if not self.max.is_real_node():
+			new_node, promote_count, levels = self.add_leaf(None, key, val)
+			if self.stats is not None:
+				self.stats.record_insert(0, promote_count, levels)
+			return (new_node, 0, promote_count)
+		# find insertion point, climbing from the nearer end towards target node's deepest ancestor
+		node, path_count = self.finger_start(key)
+		nxt = node
+		while nxt.is_real_node():
 			path_count += 1
-			node = node.right if key > node.key else node.left  
-		node = node.parent
+			node = nxt
+			nxt = node.right if key > node.key else node.left  
 
-		# insert node
-		if key < node.key:
-			node.left = new_node
-		else:
-			node.right = new_node
-		
-		new_node.parent = node
-		
-		# updating the max node field if needed
-		if new_node.key >= self.max.key: 
-			self.max = new_node
-
-		# rebalance
-		promote_count = self.rebalance_insertion(new_node)  ############ should be  "new_n?"
+		new_node, promote_count, levels = self.add_leaf(node, key, val)
+		if self.stats is not None:
+			self.stats.record_insert(path_count, promote_count, levels)
 		return (new_node, path_count, promote_count)    
 
+	"""hangs a new node under parent, where a descent for key ended, and rebalances
+
+	@type parent: AVLNode
+	@param parent: the last real node on the path to key, None if the tree is empty
+	@rtype: (AVLNode,int,int)
+	@returns: the new node, the number of PROMOTE cases during the AVL rebalancing
+	and the number of nodes the rebalancing walked
+	"""
+	def add_leaf(self, parent, key, val):
+		## update size && create new node
+		if self.t_size is not None:
+			self.t_size += 1
+		new_n = self.node_class(key, val)
+		new_n.left = self.virtual_node()
+		new_n.right = self.virtual_node()
+		new_n.left.parent = new_n
+		new_n.right.parent = new_n
+		new_n.update_height()
+		## empty tree case
+		if parent is None:
+			new_n.parent = self.root
+			self.root = new_n
+			self.max = new_n
+			self.min = new_n
+			return new_n, 1, 1
+		new_n.parent = parent
+		if key < parent.key:
+			parent.left = new_n
+			if self.threaded:
+				self.link(new_n, parent.prev, parent)
+		else:
+			parent.right = new_n
+			if self.threaded:
+				self.link(new_n, parent, parent.next)
+		## update max and min
+		if key >= self.max.key:
+			self.max = new_n
+		elif key < self.min.key:
+			self.min = new_n
+		if self.augmented:
+			self.update_sizes(parent)
+		promote_count, levels = self.rebalance_insertion(new_n)
+		return new_n, promote_count, levels
+
 	"""deletes node from the dictionary
 
 	@type node: AVLNode
@@ -647,11 +1115,19 @@ class AVLTree(object):
 	"""
 	def delete(self, node):
 		# decrease the tree's size by 1
-		self.t_size -= 1
+		if self.t_size is not None:
+			self.t_size -= 1
+		# the min has no left child, so its successor is found in O(1)
+		new_min = self.successor(node) if node is self.min else self.min
+		if self.threaded:
+			if node.prev is not None:
+				node.prev.next = node.next
+			if node.next is not None:
+				node.next.prev = node.prev
 		# initialize variables
 		# Special case: deleting the root - create virtual parent
 		if node == self.get_root():
-			prnt = AVLNode(None, None)
+			prnt = node.parent if node.parent is not None else self.virtual_node()
 			right_son = True
 		else:
 			prnt = node.parent
@@ -680,7 +1156,8 @@ class AVLTree(object):
 			suc.parent = prnt
 			if node == self.get_root():
 				self.root = suc 
-			suc.update_height() # suc location changed to be as the deleted node
+			# suc takes the deleted node's place, rebalancing measures changes against its height
+			suc.height = node.height
 		# node has one or less children
 		elif node.right.is_real_node(): # has only a right child
 			if right_son and prnt.is_real_node():
@@ -706,8 +1183,95 @@ class AVLTree(object):
 			elif node == self.max_node():
 				self.update_max() # find new max properly
 
+		self.min = new_min if new_min is not None else self.root
 		# rebalancing
-		self.rebalance_deletion(start_balance_node)
+		if self.augmented:
+			self.update_sizes(start_balance_node)
+		levels = self.rebalance_deletion(start_balance_node)
+		if self.stats is not None:
+			self.stats.deletes += 1
+			self.stats.nodes_visited += levels
+
+	"""------------------ single descent updates ------------------"""
+
+	"""descends from the root towards key
+
+	@rtype: (AVLNode, AVLNode, int)
+	@returns: the node of key (None if not found), the last real node above it on the path
+	(where key would be hung, None if the tree is empty) and the number of nodes visited
+	"""
+	def descend(self, key):
+		node = self.root
+		parent = None
+		edges = 0
+		while node.is_real_node():
+			edges += 1
+			if node.key == key:
+				return node, parent, edges
+			parent = node
+			node = node.left if key < node.key else node.right
+		return None, parent, edges
+
+	"""deletes the item of key, searching and deleting in one pass
+
+	@rtype: bool
+	@returns: whether key was in the dictionary
+	"""
+	def delete_key(self, key):
+		node, parent, edges = self.descend(key)
+		if self.stats is not None:
+			self.stats.record_search(edges)
+		if node is None:
+			return False
+		self.delete(node)
+		return True
+
+	"""deletes the item of key and returns its value
+
+	@returns: the value of key, default if key is not in the dictionary
+	"""
+	def pop(self, key, default=None):
+		node, parent, edges = self.descend(key)
+		if self.stats is not None:
+			self.stats.record_search(edges)
+		if node is None:
+			return default
+		self.delete(node)
+		return node.value
+
+	"""sets key to val, inserting key if it is not in the dictionary
+
+	@rtype: (AVLNode, bool)
+	@returns: the node of key and whether it was inserted
+	"""
+	def upsert(self, key, val):
+		node, parent, edges = self.descend(key)
+		if node is not None:
+			node.value = val
+			if self.stats is not None:
+				self.stats.record_search(edges)
+			return node, False
+		node, promote_count, levels = self.add_leaf(parent, key, val)
+		if self.stats is not None:
+			self.stats.record_insert(edges, promote_count, levels)
+		return node, True
+
+	"""returns the node of key, inserting it with the value factory() if it is not in the dictionary
+
+	@param factory: a function of no arguments, only called when key is inserted
+	@rtype: (AVLNode, bool)
+	@returns: the node of key and whether it was inserted
+	"""
+	def get_or_insert(self, key, factory):
+		node, parent, edges = self.descend(key)
+		if node is not None:
+			if self.stats is not None:
+				self.stats.record_search(edges)
+			return node, False
+		node, promote_count, levels = self.add_leaf(parent, key, factory())
+		if self.stats is not None:
+			self.stats.record_insert(edges, promote_count, levels)
+		return node, True
 
 	"""joins self with item and another AVLTree
 
@@ -718,64 +1282,198 @@ class AVLTree(object):
 	@type val: string
 	@param val: the value corresponding to key
 	@pre: all keys in self are smaller than key and all keys in tree2 are larger than key,
-	or the opposite way
+	or the opposite way; self and tree2 are in the same threaded and size augmented modes
 	"""
 	def join(self, tree2, key, val):
-		 # initialize variables
-		x = AVLNode(key, val)
-		tall, short = (self, tree2) if self.root.height >= tree2.root.height else (tree2 ,self)
-		h = short.root.height
-		if h == -1: # one of the trees is empty
-			tall.insert(x.key, x.value)
-			self.root = tall.root
-			self.max = tall.max
-			self.t_size = tall.size()
-			return
-		
-		curr = tall.root
-		if short.root.key < key:
-			# short tree has smaller keys
-			while curr.height > h: 
-				curr = curr.left
-			## update pointers
-			x.left = short.root
-			short.root.parent = x
-			origin_par = curr.parent 
-			x.right = curr
-			curr.parent = x
-			origin_par.left = x
-			x.parent = origin_par
-			## update max
-			if tall.max.is_real_node():
-				self.max = tall.max
-			else:
-				self.max = self.root
+		self.join_node(tree2, self.node_class(key, val))
+
+	"""joins self with tree2 using an existing node x as the separating item
+
+	@type x: AVLNode
+	@param x: a node that is in neither tree, its pointers are overwritten
+	@pre: as in join, with x.key as the separating key
+	"""
+	def join_node(self, tree2, x):
+		key = x.key
+		if (self.root.is_real_node() and self.root.key < key) or \
+			(tree2.root.is_real_node() and tree2.root.key > key):
+			small, large = self, tree2
 		else:
-			# short tree has larger keys
-			while curr.height > h: 
-				curr = curr.right
-			## update pointers
-			x.right = short.root
-			short.root.parent = x
-			origin_par = curr.parent 
-			x.left = curr
-			curr.parent = x
-			origin_par.right = x
-			x.parent = origin_par
+			small, large = tree2, self
+		new_max = large.max if large.max.is_real_node() else x
+		new_min = small.min if small.min.is_real_node() else x
+		if self.threaded:
+			self.link(x, small.max if small.max.is_real_node() else None,
+				large.min if large.min.is_real_node() else None)
+		if small.t_size is None or large.t_size is None:
+			new_size = None # counted on demand, see size()
+		else:
+			new_size = small.t_size + large.t_size + 1
+		self.attach(tree2.root, x, small is self)
+		if self.stats is not None:
+			self.stats.joins += 1
+		## update max, min and size
+		self.max = new_max
+		self.min = new_min
+		self.t_size = new_size
+		if tree2 is not self:
+			tree2.root = tree2.virtual_node()
+			tree2.max = tree2.root
+			tree2.min = tree2.root
+			tree2.t_size = 0
+
+	"""joins the sub-tree other into self with x as the separating item
+	Only the root changes here, max and size are left to the caller.
 
-			## update max
-			if short.max.is_real_node():
-				self.max = short.max
+	@type other: AVLNode
+	@param other: the root of a detached sub-tree (may be virtual)
+	@type larger: bool
+	@param larger: True if the keys of other are larger than x.key, and those of self smaller
+	"""
+	def attach(self, other, x, larger):
+		mine = self.root
+		if mine.height >= other.height:
+			tall, short, tall_is_small = mine, other, larger
+		else:
+			tall, short, tall_is_small = other, mine, not larger
+		h = short.height
+		# walk down tall's spine facing short to the first sub-tree not higher than short
+		curr = tall
+		par = None
+		while curr.height > h: 
+			par = curr
+			curr = curr.right if tall_is_small else curr.left
+		## update pointers
+		if tall_is_small:
+			x.left = curr
+			x.right = short
+		else:
+			x.left = short
+			x.right = curr
+		x.left.parent = x
+		x.right.parent = x
+		if par is None:
+			self.root = x
+		else:
+			x.parent = par
+			if tall_is_small:
+				par.right = x
 			else:
-				self.max = self.root
+				par.left = x
+			self.root = tall
+		self.root.parent = self.virtual_node()
+		if self.augmented:
+			self.update_sizes(x)
+		self.rebalance_insertion(x)
 
-		## epdate root and size
-		self.root = x if tall.root.height == short.root.height else tall.root
-		self.t_size = tall.size() + short.size() + 1
+	"""returns a new empty tree in the same mode as self
+
+	@rtype: AVLTree
+	"""
+	def empty_like(self):
+		tree = AVLTree.__new__(AVLTree)
+		tree.virtual = self.virtual # share the sentinel instead of making a new one
+		tree.augmented = self.augmented
+		tree.threaded = self.threaded
+		tree.node_class = self.node_class
+		tree.root = self.virtual_node()
+		tree.max = tree.root
+		tree.min = tree.root
+		tree.t_size = 0
+		tree.stats = self.stats
+		return tree
+
+	"""detaches the sub-tree rooted at node into a tree of its own
+
+	@rtype: AVLTree
+	@returns: a tree whose size is counted on demand and whose max and min are not set
+	"""
+	def tree_of(self, node):
+		tree = self.empty_like()
+		if node.is_real_node():
+			node.parent = tree.root
+			tree.root = node
+			tree.t_size = node.size if self.augmented else None
+		return tree
+
+	"""splits the dictionary at a key, self is left empty
+	O(log n). In a size augmented tree the pieces' sizes are read off their roots; a plain
+	tree has no way to know them, so they are left to size(), whose first call then walks
+	the piece in O(n), and trees joined from such a piece count on demand as well.
+
+	@param key: a key, not necessarily in the dictionary
+	@rtype: (AVLTree, AVLNode, AVLTree)
+	@returns: a tuple (left, x, right) where left holds the keys smaller than key, right
+	holds the keys larger than key, and x is the node of key (None if key is not in self)
+	"""
+	def split_key(self, key):
+		# remember the search path, the nodes on it are re-used as the join items
+		path = []
+		left_max = None # the last node we went right at is the largest key below key
+		right_min = None # and the last node we went left at the smallest key above it
+		node = self.root
+		while node.is_real_node() and node.key != key:
+			path.append(node)
+			if key < node.key:
+				right_min = node
+				node = node.left
+			else:
+				left_max = node
+				node = node.right
+		found = node if node.is_real_node() else None
+		if self.stats is not None:
+			self.stats.splits += 1
+			self.stats.comparisons += len(path) + (found is not None)
+			self.stats.nodes_visited += len(path) + (found is not None)
+		if found is not None:
+			if found.left.is_real_node():
+				left_max = found.left
+				while left_max.right.is_real_node():
+					left_max = left_max.right
+			if found.right.is_real_node():
+				right_min = found.right
+				while right_min.left.is_real_node():
+					right_min = right_min.left
+			t_left = self.tree_of(found.left)
+			t_right = self.tree_of(found.right)
+		else:
+			t_left = self.empty_like()
+			t_right = self.empty_like()
+		old_max = self.max
+		old_min = self.min
+		# joining bottom-up costs O(height difference) per step, O(log n) in total
+		for par in reversed(path):
+			if key < par.key:
+				## we went left, par and its right sub-tree hold larger keys
+				t_right.attach(par.right, par, True)
+			else:
+				t_left.attach(par.left, par, False)
+		for t in (t_left, t_right):
+			if t.root.is_real_node():
+				t.t_size = t.root.size if self.augmented else None
+		if left_max is not None:
+			t_left.max = left_max
+		if t_right.root.is_real_node():
+			t_right.max = old_max
+		if right_min is not None:
+			t_right.min = right_min
+		if t_left.root.is_real_node():
+			t_left.min = old_min
+		if self.threaded:
+			# only the links across the cut change
+			if left_max is not None:
+				left_max.next = None
+			if right_min is not None:
+				right_min.prev = None
+			if found is not None:
+				found.prev = None
+				found.next = None
+		self.root = self.virtual_node()
+		self.max = self.root
+		self.min = self.root
+		self.t_size = 0
+		return (t_left, found, t_right)
 
-		self.rebalance_insertion(x)
-		return
-	
 	"""splits the dictionary at a given node
 
 	@type node: AVLNode
@@ -784,44 +1482,829 @@ class AVLTree(object):
 	@rtype: (AVLTree, AVLTree)
 	@returns: a tuple (left, right), where left is an AVLTree representing the keys in the 
 	dictionary smaller than node.key, and right is an AVLTree representing the keys in the 
-	dictionary larger than node.key.
+	dictionary larger than node.key. self is left empty.
+	The sizes of the halves are counted as in split_key.
 	"""
 	def split(self, node):
-		t_left = node.left.to_avl_tree() if node.left.is_real_node() else AVLTree()
-		t_right = node.right.to_avl_tree() if node.right.is_real_node() else AVLTree() 
+		t_left, found, t_right = self.split_key(node.key)
+		return (t_left, t_right)
 
+	"""joins two trees that have no separating item, all keys of left are smaller
 
-		while node is not self.root:
-			par = node.parent
-			curr_t = AVLTree()
-			curr_t.max = AVLNode(None, None)
-			if node == par.left:  
-				## node is left child
-				curr_t.root = par.right
-				t_right.join(curr_t, par.key, par.value)
+	@rtype: AVLTree
+	@returns: the joined tree, left and right are not to be used afterwards
+	"""
+	def join_trees(self, left, right):
+		if not left.root.is_real_node():
+			return right
+		if not right.root.is_real_node():
+			return left
+		# left's max becomes the separating item
+		x = left.root
+		while x.right.is_real_node():
+			x = x.right
+		left.max = x
+		left.delete(x)
+		left.join_node(right, x)
+		return left
+
+	"""removes every key in [lo, hi) with two splits and a join, no per-key rebalancing
+	O(log n) in a size augmented tree. A plain tree also walks the k removed items to
+	keep its size exact, O(log n + k); if its size was already left to size() (after a
+	split, see split_key), it stays so and the next size() walks all n items.
+
+	@param lo: the smallest key to remove
+	@param hi: the first key above the range, not removed
+	@rtype: AVLTree
+	@returns: the removed items, as a tree in the same mode as self
+	"""
+	def delete_range(self, lo, hi):
+		if not lo < hi:
+			return self.empty_like()
+		size = self.t_size
+		left, low, rest = self.split_key(lo)
+		removed, high, right = rest.split_key(hi)
+		if low is not None:
+			# lo itself is removed, it sits below every key of the range
+			removed.join_node(removed.empty_like(), low)
+		if high is not None:
+			left.join_node(right, high)
+			kept = left
+		else:
+			kept = self.join_trees(left, right)
+		self.root = kept.root
+		self.root.parent = self.virtual_node()
+		self.update_max()
+		self.update_min()
+		removed.update_max()
+		removed.update_min()
+		if self.augmented:
+			self.t_size = self.root.size if self.root.is_real_node() else 0
+		elif size is not None:
+			self.t_size = size - removed.size()
+		else:
+			self.t_size = None
+		return removed
+
+	"""the join-based divide and conquer behind the set operations
+	a drives the recursion: b is split at a's root, both sides are solved
+	recursively and joined back with or without a's root. With m the size of
+	the smaller tree this costs O(m log(n/m + 1)).
+
+	@type op: str
+	@param op: "union", "intersection", "difference" (self minus other) or "symmetric_difference"
+	@param resolve: a function (key, self_value, other_value) returning the value kept on equal keys
+	@type a_is_self: bool
+	@param a_is_self: whether a holds self's keys (matters for difference and resolve)
+	@rtype: (AVLTree, int)
+	@returns: the result and the number of keys found in both trees
+	"""
+	def set_op(self, a, b, op, resolve, a_is_self):
+		if not a.root.is_real_node() or not b.root.is_real_node():
+			empty, full = (a, b) if not a.root.is_real_node() else (b, a)
+			if op == "intersection":
+				return empty, 0
+			if op == "difference":
+				return (a if a_is_self else b), 0
+			return full, 0
+		r = a.root
+		if op == "union" and r.height <= UNION_CUTOFF_HEIGHT:
+			# a handful of items is cheaper to insert one by one than to split b for
+			common = 0
+			start = r # pieces do not keep a min pointer
+			while start.left.is_real_node():
+				start = start.left
+			for node in list(a.walk(start)):
+				found, parent, edges = b.descend(node.key)
+				if found is not None:
+					if a_is_self:
+						found.value = resolve(node.key, node.value, found.value)
+					else:
+						found.value = resolve(node.key, found.value, node.value)
+					common += 1
+				else:
+					b.add_leaf(parent, node.key, node.value)
+			return b, common
+		a_left = a.tree_of(r.left)
+		a_right = a.tree_of(r.right)
+		if a.threaded:
+			# r leaves both pieces, so the links across it are cut and each piece gets its ends
+			if r.left.is_real_node():
+				a_left.min = a.min
+				a_left.max = r.prev
+				r.prev.next = None
+			if r.right.is_real_node():
+				a_right.max = a.max
+				a_right.min = r.next
+				r.next.prev = None
+			r.prev = None
+			r.next = None
+		b_left, found, b_right = b.split_key(r.key)
+		left, common_left = self.set_op(a_left, b_left, op, resolve, a_is_self)
+		right, common_right = self.set_op(a_right, b_right, op, resolve, a_is_self)
+		common = common_left + common_right
+		if found is not None:
+			common += 1
+			if a_is_self:
+				r.value = resolve(r.key, r.value, found.value)
 			else:
-				## node is right child
-				curr_t.root = par.left
-				t_left.join(curr_t, par.key, par.value)
+				r.value = resolve(r.key, found.value, r.value)
+		if op == "union":
+			keep = True
+		elif op == "intersection":
+			keep = found is not None
+		elif op == "difference":
+			keep = a_is_self and found is None
+		else:
+			keep = found is None
+		if keep:
+			left.join_node(right, r)
+			return left, common
+		return self.join_trees(left, right), common
 
-			t_left.update_max()
-			t_right.update_max()
-			
-		return(t_left, t_right)
+	"""replaces self's keys with op applied to self and other, other is left empty
+
+	@rtype: int
+	@returns: the number of keys found in both trees
+	"""
+	def combine(self, other, op, prefer="self"):
+		if other is self:
+			# every key is in both, and the tree cannot be split against itself
+			common = self.size()
+			if op in ("difference", "symmetric_difference"):
+				self.root = self.virtual_node()
+				self.max = self.root
+				self.min = self.root
+				self.t_size = 0
+			return common
+		if prefer == "self":
+			resolve = lambda key, mine, theirs: mine
+		elif prefer == "other":
+			resolve = lambda key, mine, theirs: theirs
+		else:
+			resolve = prefer
+		source = other
+		source_augmented = source.augmented
+		source_threaded = source.threaded
+		threaded = self.threaded
+		if (threaded and not other.threaded) or (self.augmented and not other.augmented):
+			# other's nodes have no room for links or sizes, its items are copied into nodes that do
+			other = AVLTree.from_sorted(other.items(), other.size(), other.virtual is not None, self.augmented, threaded)
+		# the pieces cut from other must follow self's mode until other is emptied
+		other.augmented = self.augmented
+		sizes = (self.t_size, other.t_size)
+		# the pieces keep their links, split_key and join_node fix them at the seams;
+		# a plain self takes other's nodes without links
+		other.threaded = threaded
+		mine = self.empty_like()
+		mine.root, mine.max, mine.min, mine.t_size = self.root, self.max, self.min, self.t_size
+		# recurse on the lower tree and split the higher one
+		if mine.root.height <= other.root.height:
+			result, common = self.set_op(mine, other, op, resolve, True)
+		else:
+			result, common = self.set_op(other, mine, op, resolve, False)
+		self.root = result.root
+		self.root.parent = self.virtual_node()
+		self.update_max()
+		self.update_min()
+		if self.augmented:
+			self.t_size = self.root.size
+		elif None in sizes:
+			self.t_size = None
+		elif op == "union":
+			self.t_size = sizes[0] + sizes[1] - common
+		elif op == "intersection":
+			self.t_size = common
+		elif op == "difference":
+			self.t_size = sizes[0] - common
+		else:
+			self.t_size = sizes[0] + sizes[1] - 2 * common
+		for t in (other, source):
+			t.root = t.virtual_node()
+			t.max = t.root
+			t.min = t.root
+			t.t_size = 0
+		source.threaded = source_threaded
+		source.augmented = source_augmented
+		return common
+
+	"""makes self the union of self and other, other is left empty
+
+	@type other: AVLTree
+	@param prefer: which value is kept on equal keys: "self", "other",
+	or a function (key, self_value, other_value) returning the value
+	@rtype: int
+	@returns: the number of keys found in both trees
+	"""
+	def union(self, other, prefer="self"):
+		return self.combine(other, "union", prefer)
+
+	"""keeps only the keys of self that are also in other, other is left empty
+
+	@type other: AVLTree
+	@param prefer: which value is kept, as in union
+	@rtype: int
+	@returns: the number of keys found in both trees
+	"""
+	def intersection(self, other, prefer="self"):
+		return self.combine(other, "intersection", prefer)
+
+	"""removes the keys of other from self, other is left empty
 
+	@type other: AVLTree
+	@rtype: int
+	@returns: the number of keys found in both trees
+	"""
+	def difference(self, other):
+		return self.combine(other, "difference")
+
+	"""keeps the keys that are in exactly one of self and other, other is left empty
+
+	@type other: AVLTree
+	@rtype: int
+	@returns: the number of keys found in both trees
+	"""
+	def symmetric_difference(self, other):
+		return self.combine(other, "symmetric_difference")
+
+	"""inserts a batch of items, existing keys get the batch's value
+
+	An empty dictionary is built from the sorted batch in O(m). Otherwise the batch is
+	inserted in key order, each key sought from the node of the one before it with
+	seek_from. A seek climbs only as far as the gap between the two keys requires, so with
+	m keys spread over n this costs O(m log(n/m + 1)) instead of m root descents, and the
+	rebalancing is O(1) amortized per new key.
+
+	@type pairs: iterable
+	@param pairs: (key, value) pairs in any order, the last value wins on repeated keys
+	@rtype: int
+	@returns: the number of keys that were not in the dictionary before
+	"""
+	def insert_many(self, pairs):
+		batch = sorted(pairs, key=lambda pair: pair[0])
+		if not self.root.is_real_node():
+			# nothing to seek through, the batch is built in O(m)
+			unique = []
+			for pair in batch:
+				if unique and unique[-1][0] == pair[0]:
+					unique[-1] = pair
+				else:
+					unique.append(pair)
+			built = AVLTree.from_sorted(unique, len(unique), self.virtual is not None, self.augmented, self.threaded)
+			self.virtual = built.virtual
+			self.root = built.root
+			self.max = built.max
+			self.min = built.min
+			self.t_size = built.t_size
+			return len(unique)
+		added = 0
+		node = self.get_root()
+		for key, val in batch:
+			found, ceiling, edges = self.seek_from(node, key)
+			if found is not None:
+				found.value = val
+				node = found
+				continue
+			# a new key hangs left of its ceiling, or right of its floor if that spot is taken
+			if ceiling is not None and not ceiling.left.is_real_node():
+				parent = ceiling
+			else:
+				parent = self.max if ceiling is None else self.predecessor(ceiling)
+			node, promote_count, levels = self.add_leaf(parent, key, val)
+			if self.stats is not None:
+				self.stats.record_insert(edges, promote_count, levels)
+			added += 1
+		return added
+	
 	"""returns an array representing dictionary 
 
 	@rtype: list
 	@returns: a sorted list according to key of touples (key, value) representing the data structure
 	"""
 	def avl_to_array(self):
-		node = self.min_node()
+		return list(self.items())
+
+	"""------------------ serialization ------------------"""
+
+	"""writes the dictionary to a binary file in key order, in chunks
+
+	@type file: file
+	@param file: a file opened for binary writing
+	@rtype: int
+	@returns: the number of bytes written
+	"""
+	def dump(self, file):
+		flags = (FLAG_SHARED_SENTINEL if self.virtual is not None else 0) | \
+			(FLAG_SIZE_AUGMENTED if self.augmented else 0) | \
+			(FLAG_THREADED if self.threaded else 0)
+		header = DUMP_HEADER.pack(DUMP_MAGIC, DUMP_VERSION, flags, self.size())
+		file.write(header)
+		written = len(header)
+		buf = bytearray()
+		for key, value in self.items():
+			key_tag, key_bytes = encode_field(key)
+			value_tag, value_bytes = encode_field(value)
+			buf += DUMP_RECORD.pack(key_tag, len(key_bytes), value_tag, len(value_bytes))
+			buf += key_bytes
+			buf += value_bytes
+			if len(buf) >= DUMP_CHUNK:
+				written += write_frame(file, buf)
+				buf = bytearray()
+		if buf:
+			written += write_frame(file, buf)
+		return written
+
+	"""reads a dictionary written by dump, built in O(n) by from_sorted
+
+	@type file: file
+	@param file: a file opened for binary reading, positioned at the header;
+	it is left right after the dump
+	@rtype: AVLTree
+	"""
+	@classmethod
+	def load(cls, file):
+		header = file.read(DUMP_HEADER.size)
+		if len(header) < DUMP_HEADER.size:
+			raise ValueError("not an AVLTree dump: the header is truncated")
+		magic, version, flags, n = DUMP_HEADER.unpack(header)
+		if magic != DUMP_MAGIC or version != DUMP_VERSION:
+			raise ValueError("not an AVLTree dump, or an unsupported version")
+		return cls.from_sorted(read_records(file, n), n,
+			bool(flags & FLAG_SHARED_SENTINEL), bool(flags & FLAG_SIZE_AUGMENTED), bool(flags & FLAG_THREADED))
+
+	"""returns the dump of the dictionary as bytes
+
+	@rtype: bytes
+	"""
+	def dumps(self):
+		out = io.BytesIO()
+		self.dump(out)
+		return out.getvalue()
+
+	"""pickles the tree as its dump, so pickle never recurses into the node graph"""
+	def __reduce__(self):
+		return (tree_from_bytes, (type(self), self.dumps()))
+
+	"""------------------ order statistics (size augmented trees) ------------------"""
+
+	"""returns the node holding the i-th smallest key, counting from 0
+
+	@type i: int
+	@pre: the tree is size augmented
+	@rtype: AVLNode
+	@returns: the node, None if i is out of range
+	"""
+	def select(self, i):
+		if not self.augmented:
+			raise ValueError("select needs a tree built with size_augmented=True")
+		node = self.root
+		while node.is_real_node():
+			left_size = node.left.size
+			if i < left_size:
+				node = node.left
+			elif i == left_size:
+				return node
+			else:
+				i -= left_size + 1
+				node = node.right
+		return None
+
+	"""returns the number of keys smaller than key (or equal to it, if inclusive)
+
+	@param key: a key, not necessarily in the dictionary
+	@pre: the tree is size augmented
+	@rtype: int
+	"""
+	def rank(self, key, inclusive=False):
+		if not self.augmented:
+			raise ValueError("rank needs a tree built with size_augmented=True")
+		node = self.root
+		count = 0
+		while node.is_real_node():
+			if node.key < key or (inclusive and node.key == key):
+				count += node.left.size + 1
+				node = node.right
+			else:
+				node = node.left
+		return count
+
+	"""returns the (key, value) pair at index i of the sorted dictionary, negative i counts from the end
+
+	@pre: the tree is size augmented
+	"""
+	def __getitem__(self, i):
+		if i < 0:
+			i += self.size()
+		node = self.select(i) if i >= 0 else None
 		if node is None:
-			return []
-		arr = []
-		while node is not self.max:
-			arr.append((node.key, node.value))
-			node = self.successor(node)
-		arr.append((node.key, node.value))
-		return arr
-		
+			raise IndexError("AVLTree index out of range")
+		return (node.key, node.value)
+
+	"""------------------ nearest key queries ------------------"""
+
+	"""returns the node with the largest key <= key, in one descent from the root
+
+	@rtype: AVLNode
+	@returns: the node, None if every key is larger
+	"""
+	def floor(self, key):
+		return self.floor_node(key, True)
+
+	"""returns the node with the smallest key >= key, in one descent from the root
+
+	@rtype: AVLNode
+	@returns: the node, None if every key is smaller
+	"""
+	def ceiling(self, key):
+		return self.ceiling_node(key, True)
+
+	"""returns the node with the largest key < key, in one descent from the root
+
+	@rtype: AVLNode
+	@returns: the node, None if there is none
+	"""
+	def lower(self, key):
+		return self.floor_node(key, False)
+
+	"""returns the node with the smallest key > key, in one descent from the root
+
+	@rtype: AVLNode
+	@returns: the node, None if there is none
+	"""
+	def higher(self, key):
+		return self.ceiling_node(key, False)
+
+	"""returns the k nodes whose keys are nearest to key, in one descent from the root
+	and a walk outwards, O(log n + k). Keys must support subtraction.
+
+	@rtype: list
+	@returns: the nodes by distance from key, the smaller key first on a tie
+	"""
+	def nearest(self, key, k=1):
+		return self.nearest_around(key, self.floor_node(key, True), k)
+
+	"""the finger variants climb from the nearer end of the dictionary, see finger_start,
+	so a key close to the max or the min costs O(log d) with d its distance from that end"""
+
+	def finger_floor(self, key):
+		return self.finger_bound("floor", key)
+
+	def finger_ceiling(self, key):
+		return self.finger_bound("ceiling", key)
+
+	def finger_lower(self, key):
+		return self.finger_bound("lower", key)
+
+	def finger_higher(self, key):
+		return self.finger_bound("higher", key)
+
+	def finger_nearest(self, key, k=1):
+		return self.nearest_around(key, self.finger_bound("floor", key), k)
+
+	"""seeks key from the nearer end and returns the node asked for by kind
+
+	@type kind: str
+	@param kind: "floor", "ceiling", "lower" or "higher"
+	@rtype: AVLNode
+	@returns: the node, None if there is none
+	"""
+	def finger_bound(self, kind, key):
+		if not self.root.is_real_node():
+			return None
+		start, climbs = self.finger_start(key)
+		found, ceiling, edges = self.seek_from(start, key)
+		if self.stats is not None:
+			self.stats.record_search(climbs + edges)
+		return self.bound_of(kind, found, ceiling)
+
+	"""turns the result of seek_from into the node asked for by kind
+
+	@type kind: str
+	@param kind: "floor", "ceiling", "lower" or "higher"
+	@param found: the node of the key sought, None if it is not in the dictionary
+	@param ceiling: the node with the smallest key >= the key sought, None if there is none
+	@rtype: AVLNode
+	"""
+	def bound_of(self, kind, found, ceiling):
+		if kind == "ceiling":
+			return ceiling
+		if kind == "higher":
+			return ceiling if found is None else self.successor(found)
+		if kind == "floor" and found is not None:
+			return found
+		# the largest key below the key sought sits just before its ceiling
+		return self.max_node() if ceiling is None else self.predecessor(ceiling)
+
+	"""collects the k nodes nearest to key, walking outwards from its floor
+
+	@param lo: the node with the largest key <= key, None if there is none
+	@rtype: list
+	"""
+	def nearest_around(self, key, lo, k):
+		hi = self.min_node() if lo is None else self.successor(lo)
+		result = []
+		while len(result) < k and (lo is not None or hi is not None):
+			if hi is None or (lo is not None and key - lo.key <= hi.key - key):
+				result.append(lo)
+				lo = self.predecessor(lo)
+			else:
+				result.append(hi)
+				hi = self.successor(hi)
+		return result
+
+	"""------------------ iteration functions ------------------"""
+
+	"""yields the nodes of the dictionary in key order, starting at node
+	Each step climbs or descends only as far as the next node, so a full walk
+	costs O(n) in total and O(1) extra memory.
+
+	@type node: AVLNode
+	@param node: the first node to yield, None for an empty walk
+	@type reverse: bool
+	@param reverse: walk in decreasing key order
+	@pre: the dictionary is not modified while the walk is running
+	"""
+	def walk(self, node, reverse=False):
+		if self.threaded:
+			while node is not None:
+				yield node
+				node = node.prev if reverse else node.next
+			return
+		root = self.root
+		while node is not None:
+			yield node
+			nxt = node.left if reverse else node.right
+			if nxt.is_real_node():
+				# down once to the far side, then all the way to the near side
+				node = nxt
+				nxt = node.right if reverse else node.left
+				while nxt.is_real_node():
+					node = nxt
+					nxt = node.right if reverse else node.left
+				continue
+			# up while we are coming from the far side
+			while node is not root:
+				par = node.parent
+				if (par.left if reverse else par.right) is not node:
+					break
+				node = par
+			node = None if node is root else node.parent
+
+	"""yields (key, value) pairs in key order
+
+	@type reverse: bool
+	@param reverse: yield in decreasing key order
+	"""
+	def items(self, reverse=False):
+		start = self.max_node() if reverse else self.min_node()
+		for node in self.walk(start, reverse):
+			yield (node.key, node.value)
+
+	"""yields the keys in key order
+
+	@type reverse: bool
+	@param reverse: yield in decreasing key order
+	"""
+	def keys(self, reverse=False):
+		start = self.max_node() if reverse else self.min_node()
+		for node in self.walk(start, reverse):
+			yield node.key
+
+	"""yields the values in key order
+
+	@type reverse: bool
+	@param reverse: yield in decreasing key order
+	"""
+	def values(self, reverse=False):
+		start = self.max_node() if reverse else self.min_node()
+		for node in self.walk(start, reverse):
+			yield node.value
+
+	"""yields (key, value) pairs in decreasing key order"""
+	def reversed(self):
+		return self.items(reverse=True)
+
+	"""yields the (key, value) pairs with lo <= key < hi in key order, in O(log n + k)
+
+	@param lo: the lower bound, None for no bound
+	@param hi: the upper bound, None for no bound
+	@type reverse: bool
+	@param reverse: yield in decreasing key order
+	@type lo_inclusive: bool
+	@param lo_inclusive: whether a key equal to lo is in the range
+	@type hi_inclusive: bool
+	@param hi_inclusive: whether a key equal to hi is in the range
+	"""
+	def range(self, lo=None, hi=None, reverse=False, lo_inclusive=True, hi_inclusive=False):
+		if not reverse:
+			start = self.min_node() if lo is None else self.ceiling_node(lo, lo_inclusive)
+			for node in self.walk(start):
+				if hi is not None and (hi < node.key or (hi == node.key and not hi_inclusive)):
+					return
+				yield (node.key, node.value)
+		else:
+			start = self.max_node() if hi is None else self.floor_node(hi, hi_inclusive)
+			for node in self.walk(start, True):
+				if lo is not None and (node.key < lo or (lo == node.key and not lo_inclusive)):
+					return
+				yield (node.key, node.value)
+
+	"""returns the number of keys in the range, bounds as in range()
+	O(log n) in a size augmented tree, O(log n + k) otherwise
+
+	@rtype: int
+	"""
+	def count_range(self, lo=None, hi=None, lo_inclusive=True, hi_inclusive=False):
+		if self.augmented:
+			upper = self.size() if hi is None else self.rank(hi, hi_inclusive)
+			lower = 0 if lo is None else self.rank(lo, not lo_inclusive)
+			return max(upper - lower, 0)
+		count = 0
+		for item in self.range(lo, hi, False, lo_inclusive, hi_inclusive):
+			count += 1
+		return count
+
+	def __iter__(self):
+		return self.keys()
+
+	def __reversed__(self):
+		return self.keys(reverse=True)
+
+"""
+A cursor over an AVLTree, remembering a current node.
+next() and prev() move to the neighbouring keys, in O(1) amortized, and seek(),
+floor(), ceiling(), lower() and higher() move to a key climbing from the current
+node only as far as needed, so nearby keys are reached without a descent from the root.
+The tree must not be changed while the cursor is in use, except by deleting
+nodes other than the cursor's.
+"""
+
+class AVLCursor(object):
+
+	"""@type node: AVLNode
+	@param node: the starting node, None for a cursor past either end
+	"""
+	def __init__(self, tree, node=None):
+		self.tree = tree
+		self.node = node
+
+	"""returns whether the cursor is on a node
+
+	@rtype: bool
+	"""
+	def valid(self):
+		return self.node is not None
+
+	def key(self):
+		return None if self.node is None else self.node.key
+
+	def value(self):
+		return None if self.node is None else self.node.value
+
+	"""moves to the successor
+
+	@rtype: AVLNode
+	@returns: the new current node, None past the maximum
+	"""
+	def next(self):
+		if self.node is not None:
+			self.node = self.tree.successor(self.node)
+		return self.node
+
+	"""moves to the predecessor
+
+	@rtype: AVLNode
+	@returns: the new current node, None before the minimum
+	"""
+	def prev(self):
+		if self.node is not None:
+			self.node = self.tree.predecessor(self.node)
+		return self.node
+
+	"""moves to the smallest key >= key, starting from the current node
+
+	@rtype: AVLNode
+	@returns: the node of key, None if key is not in the dictionary
+	(the cursor is then on the next larger key, or past the end)
+	"""
+	def seek(self, key):
+		start = self.node
+		if start is None:
+			start = self.tree.get_root()
+			if start is None:
+				return None
+		found, self.node, edges = self.tree.seek_from(start, key)
+		return found
+
+	"""moves to the node asked for by kind, seeking from the current node
+
+	@type kind: str
+	@param kind: "floor", "ceiling", "lower" or "higher", as in AVLTree.floor and the rest
+	@rtype: AVLNode
+	@returns: the new current node, None (past either end) if there is none
+	"""
+	def seek_bound(self, kind, key):
+		start = self.node
+		if start is None:
+			start = self.tree.get_root()
+			if start is None:
+				return None
+		found, ceiling, edges = self.tree.seek_from(start, key)
+		self.node = self.tree.bound_of(kind, found, ceiling)
+		return self.node
+
+	def floor(self, key):
+		return self.seek_bound("floor", key)
+
+	def ceiling(self, key):
+		return self.seek_bound("ceiling", key)
+
+	def lower(self, key):
+		return self.seek_bound("lower", key)
+
+	def higher(self, key):
+		return self.seek_bound("higher", key)
+
+"""------------------ serialization help functions ------------------"""
+
+"""encodes a key or a value as (tag, bytes), anything but int, str, bytes and float is pickled"""
+def encode_field(x):
+	kind = type(x)
+	if kind is int:
+		return TAG_INT, x.to_bytes((x.bit_length() + 8) // 8, "little", signed=True)
+	if kind is str:
+		return TAG_STR, x.encode("utf-8")
+	if kind is bytes:
+		return TAG_BYTES, x
+	if kind is float:
+		return TAG_FLOAT, struct.pack("<d", x)
+	return TAG_PICKLE, pickle.dumps(x, pickle.HIGHEST_PROTOCOL)
+
+"""decodes the bytes of a field written by encode_field"""
+def decode_field(tag, data):
+	if tag == TAG_INT:
+		return int.from_bytes(data, "little", signed=True)
+	if tag == TAG_STR:
+		return data.decode("utf-8")
+	if tag == TAG_BYTES:
+		return data
+	if tag == TAG_FLOAT:
+		return struct.unpack("<d", data)[0]
+	if tag == TAG_PICKLE:
+		return pickle.loads(data)
+	raise ValueError(f"unknown field tag {tag} in AVLTree dump")
+
+"""writes buf as one frame of a dump
+
+@rtype: int
+@returns: the number of bytes written
+"""
+def write_frame(file, buf):
+	file.write(DUMP_FRAME.pack(len(buf)))
+	file.write(buf)
+	return DUMP_FRAME.size + len(buf)
+
+"""reads the next frame of a dump
+
+@rtype: bytes
+"""
+def read_frame(file):
+	head = file.read(DUMP_FRAME.size)
+	if len(head) < DUMP_FRAME.size:
+		raise ValueError("the AVLTree dump is truncated")
+	length = DUMP_FRAME.unpack(head)[0]
+	data = file.read(length)
+	if len(data) < length:
+		raise ValueError("the AVLTree dump is truncated")
+	return data
+
+"""yields the n (key, value) records of a dump, reading the file a frame at a time"""
+def read_records(file, n):
+	buf = b""
+	pos = 0
+	head = DUMP_RECORD.size
+	for i in range(n):
+		if pos == len(buf):
+			buf = read_frame(file)
+			pos = 0
+		if len(buf) - pos < head:
+			raise ValueError("a record of the AVLTree dump is cut by its frame")
+		key_tag, key_len, value_tag, value_len = DUMP_RECORD.unpack_from(buf, pos)
+		pos += head
+		if len(buf) - pos < key_len + value_len:
+			raise ValueError("a record of the AVLTree dump is cut by its frame")
+		end = pos + key_len
+		# int keys and str values are the common case, decoded inline
+		if key_tag == TAG_INT:
+			key = int.from_bytes(buf[pos:end], "little", signed=True)
+		else:
+			key = decode_field(key_tag, buf[pos:end])
+		pos = end + value_len
+		if value_tag == TAG_STR:
+			yield (key, buf[end:pos].decode("utf-8"))
+		else:
+			yield (key, decode_field(value_tag, buf[end:pos]))
+
+"""rebuilds a pickled tree, see AVLTree.__reduce__"""
+def tree_from_bytes(cls, data):
+	return cls.load(io.BytesIO(data))
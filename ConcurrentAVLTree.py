@@ -0,0 +1,169 @@
+"""A thread-safe wrapper around AVLTree.
+
+Reads (search, range scans, iteration) share a readers-writer lock and run
+together. Writes are queued and a writer applies every queued write in one
+exclusive section, so a burst of writers from a thread pool takes the
+exclusive lock once instead of once per write. Only threading primitives are
+used, nothing relies on the GIL, so this also holds on free-threaded builds.
+"""
+
+import threading
+from contextlib import contextmanager
+from AVLTree import AVLTree
+
+"""A readers-writer lock that prefers writers, so readers cannot starve them"""
+
+class ReadWriteLock(object):
+
+	def __init__(self):
+		self.cond = threading.Condition(threading.Lock())
+		self.readers = 0
+		self.writer = False
+		self.waiting_writers = 0
+
+	def acquire_read(self):
+		with self.cond:
+			while self.writer or self.waiting_writers:
+				self.cond.wait()
+			self.readers += 1
+
+	def release_read(self):
+		with self.cond:
+			self.readers -= 1
+			if self.readers == 0:
+				self.cond.notify_all()
+
+	def acquire_write(self):
+		with self.cond:
+			self.waiting_writers += 1
+			while self.writer or self.readers:
+				self.cond.wait()
+			self.waiting_writers -= 1
+			self.writer = True
+
+	def release_write(self):
+		with self.cond:
+			self.writer = False
+			self.cond.notify_all()
+
+	@contextmanager
+	def read_locked(self):
+		self.acquire_read()
+		try:
+			yield
+		finally:
+			self.release_read()
+
+	@contextmanager
+	def write_locked(self):
+		self.acquire_write()
+		try:
+			yield
+		finally:
+			self.release_write()
+
+"""
+A class wrapping an AVLTree for use from many threads.
+Reads return keys and values, never nodes, since a node may change once the lock is released.
+"""
+
+class ConcurrentAVLTree(object):
+
+	"""Constructor
+
+	@type tree: AVLTree
+	@param tree: the tree to wrap, a new empty tree if None; it must not be used directly afterwards
+	@type batch_size: int
+	@param batch_size: queued writes are applied once this many are waiting; with 1 every
+	write is applied before it returns, otherwise writes become visible on flush()
+	"""
+	def __init__(self, tree=None, batch_size=1):
+		self.tree = AVLTree() if tree is None else tree
+		self.lock = ReadWriteLock()
+		self.queue_lock = threading.Lock()
+		self.pending = []
+		self.batch_size = batch_size
+
+	"""------------------ reads ------------------"""
+
+	"""returns the value of key, default if it is not in the dictionary"""
+	def get(self, key, default=None):
+		with self.lock.read_locked():
+			node = self.tree.search(key)[0]
+			return default if node is None else node.value
+
+	"""returns whether key is in the dictionary
+
+	@rtype: bool
+	"""
+	def contains(self, key):
+		with self.lock.read_locked():
+			return self.tree.search(key)[0] is not None
+
+	"""returns the (key, value) pairs of a range as a list, arguments as in AVLTree.range
+
+	@rtype: list
+	"""
+	def range(self, lo=None, hi=None, reverse=False, lo_inclusive=True, hi_inclusive=False):
+		with self.lock.read_locked():
+			return list(self.tree.range(lo, hi, reverse, lo_inclusive, hi_inclusive))
+
+	"""returns a sorted list of (key, value) pairs
+
+	@rtype: list
+	"""
+	def items(self):
+		with self.lock.read_locked():
+			return list(self.tree.items())
+
+	"""returns the number of items in the dictionary
+
+	@rtype: int
+	"""
+	def size(self):
+		with self.lock.read_locked():
+			return self.tree.size()
+
+	def __iter__(self):
+		return iter([key for key, value in self.items()])
+
+	"""------------------ writes ------------------"""
+
+	"""sets key to val, replacing the value if key exists"""
+	def insert(self, key, val):
+		self.submit(("insert", key, val))
+
+	"""removes key if it is in the dictionary"""
+	def delete(self, key):
+		self.submit(("delete", key, None))
+
+	"""queues a write and applies the queue once it is batch_size long
+
+	@type op: tuple
+	@param op: (kind, key, value) with kind "insert" or "delete"
+	"""
+	def submit(self, op):
+		with self.queue_lock:
+			self.pending.append(op)
+			full = len(self.pending) >= self.batch_size
+		if full:
+			self.flush()
+
+	"""applies every queued write, in the order they were queued, in one exclusive section
+
+	@rtype: int
+	@returns: the number of writes applied by this call
+	"""
+	def flush(self):
+		with self.lock.write_locked():
+			# writers that queued while we waited for the lock are applied here too
+			with self.queue_lock:
+				batch = self.pending
+				self.pending = []
+			tree = self.tree
+			for kind, key, val in batch:
+				if kind == "insert":
+					tree.upsert(key, val)
+				else:
+					tree.delete_key(key)
+			return len(batch)
@@ -0,0 +1,269 @@
+"""A durable AVLTree backed by a write-ahead log and binary snapshots.
+
+Every insert, finger_insert and delete is appended to a log in a directory.
+Log records are buffered and written with one fsync per group of records
+(group commit), so a crash loses at most the records after the last sync.
+A buffered record is only written once its group is full, on sync() or close(),
+or, with sync_interval, on the first write after it has waited that long; a tree
+that is dropped without close() loses its buffered records.
+Once the log is long enough the tree is dumped to a snapshot and the log is
+started over. On open, the snapshot is loaded and the log tail replayed.
+
+Replaying a record is idempotent (an insert sets the key, a delete of a missing
+key does nothing), so a crash between writing a snapshot and clearing the log
+only replays records the snapshot already holds.
+"""
+
+import os
+import struct
+import time
+import zlib
+from AVLTree import AVLTree, encode_field, decode_field
+
+SNAPSHOT_NAME = "snapshot.avl"
+LOG_NAME = "wal.log"
+# op, key tag, key length, value tag, value length; followed by the key and value
+# bytes and a crc32 of everything before it
+LOG_RECORD = struct.Struct("<BBIBI")
+LOG_CRC = struct.Struct("<I")
+OP_INSERT = 1
+OP_DELETE = 2
+
+"""------------------ help functions ------------------"""
+
+"""fsyncs a directory so a rename inside it survives a crash, where the platform allows it"""
+def fsync_dir(path):
+	try:
+		fd = os.open(path, os.O_RDONLY)
+	except OSError:
+		return
+	try:
+		os.fsync(fd)
+	except OSError:
+		pass
+	finally:
+		os.close(fd)
+
+"""encodes one log record
+
+@rtype: bytes
+"""
+def encode_record(op, key, value):
+	key_tag, key_bytes = encode_field(key)
+	value_tag, value_bytes = encode_field(value)
+	body = LOG_RECORD.pack(op, key_tag, len(key_bytes), value_tag, len(value_bytes)) + key_bytes + value_bytes
+	return body + LOG_CRC.pack(zlib.crc32(body))
+
+"""reads the complete records of a log
+
+@rtype: (list, int)
+@returns: the (op, key, value) records and the length of the valid prefix of the log;
+a torn or corrupt record ends the log
+"""
+def read_log(data):
+	records = []
+	pos = 0
+	while pos + LOG_RECORD.size <= len(data):
+		op, key_tag, key_len, value_tag, value_len = LOG_RECORD.unpack_from(data, pos)
+		end = pos + LOG_RECORD.size + key_len + value_len
+		if end + LOG_CRC.size > len(data):
+			break
+		if LOG_CRC.unpack_from(data, end)[0] != zlib.crc32(data[pos:end]):
+			break
+		key_start = pos + LOG_RECORD.size
+		key = decode_field(key_tag, data[key_start:key_start + key_len])
+		value = decode_field(value_tag, data[key_start + key_len:end])
+		records.append((op, key, value))
+		pos = end + LOG_CRC.size
+	return records, pos
+
+"""
+A class implementing a durable AVL tree stored in a directory.
+"""
+
+class DurableAVLTree(object):
+
+	"""opens the tree in directory, recovering it from the snapshot and the log
+
+	@type directory: str
+	@param directory: where the snapshot and the log are kept, created if missing
+	@type fsync_batch: int
+	@param fsync_batch: the log is written and fsynced once per this many records,
+	1 makes every write durable before it returns
+	@type compact_every: int
+	@param compact_every: a snapshot is written once the log holds this many records
+	@type sync_interval: float
+	@param sync_interval: None, or the seconds after which a write also syncs the
+	records buffered before it, however few they are
+	@param shared_sentinel, size_augmented: the mode of the tree, as in AVLTree;
+	a snapshot written in another mode is rebuilt in this one
+	"""
+	def __init__(self, directory, fsync_batch=64, compact_every=100000, shared_sentinel=True, size_augmented=False,
+			sync_interval=None):
+		self.directory = directory
+		self.fsync_batch = fsync_batch
+		self.compact_every = compact_every
+		self.sync_interval = sync_interval
+		os.makedirs(directory, exist_ok=True)
+		snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+		if os.path.exists(snapshot_path):
+			with open(snapshot_path, "rb") as f:
+				self.tree = AVLTree.load(f)
+			if self.tree.augmented != size_augmented or (self.tree.virtual is not None) != shared_sentinel:
+				self.tree = AVLTree.from_sorted(self.tree.items(), self.tree.size(), shared_sentinel, size_augmented)
+		else:
+			self.tree = AVLTree(shared_sentinel, size_augmented)
+		self.log_path = os.path.join(directory, LOG_NAME)
+		self.log_records = self.replay()
+		self.log = open(self.log_path, "ab")
+		self.pending = []
+		self.last_sync = time.monotonic()
+
+	"""applies the records of the log to the tree and cuts off a torn tail
+
+	@rtype: int
+	@returns: the number of records replayed
+	"""
+	def replay(self):
+		if not os.path.exists(self.log_path):
+			return 0
+		with open(self.log_path, "rb") as f:
+			data = f.read()
+		records, valid = read_log(data)
+		for op, key, value in records:
+			if op == OP_INSERT:
+				self.tree.upsert(key, value)
+			else:
+				self.tree.delete_key(key)
+		if valid < len(data):
+			# a crash in the middle of a write, the partial record was never acknowledged
+			with open(self.log_path, "r+b") as f:
+				f.truncate(valid)
+				f.flush()
+				os.fsync(f.fileno())
+		return len(records)
+
+	"""------------------ writes ------------------"""
+
+	"""inserts as AVLTree.insert and logs it
+
+	@rtype: (AVLNode,int,int)
+	"""
+	def insert(self, key, val):
+		result = self.tree.insert(key, val)
+		self.append(encode_record(OP_INSERT, key, val))
+		return result
+
+	"""inserts as AVLTree.finger_insert and logs it
+
+	@rtype: (AVLNode,int,int)
+	"""
+	def finger_insert(self, key, val):
+		result = self.tree.finger_insert(key, val)
+		self.append(encode_record(OP_INSERT, key, val))
+		return result
+
+	"""deletes as AVLTree.delete and logs it
+
+	@type node: AVLNode
+	@pre: node is a real pointer to a node in self
+	"""
+	def delete(self, node):
+		key = node.key
+		self.tree.delete(node)
+		self.append(encode_record(OP_DELETE, key, b""))
+
+	"""sets key as AVLTree.upsert and logs it
+
+	@rtype: (AVLNode, bool)
+	"""
+	def upsert(self, key, val):
+		result = self.tree.upsert(key, val)
+		self.append(encode_record(OP_INSERT, key, val))
+		return result
+
+	"""deletes key as AVLTree.delete_key, logging it if key was there
+
+	@rtype: bool
+	"""
+	def delete_key(self, key):
+		removed = self.tree.delete_key(key)
+		if removed:
+			self.append(encode_record(OP_DELETE, key, b""))
+		return removed
+
+	"""buffers a log record, syncing and compacting when their batch is full"""
+	def append(self, record):
+		self.pending.append(record)
+		self.log_records += 1
+		if len(self.pending) >= self.fsync_batch or \
+			(self.sync_interval is not None and time.monotonic() - self.last_sync >= self.sync_interval):
+			self.sync()
+		if self.log_records >= self.compact_every:
+			self.compact()
+
+	"""writes the buffered log records and fsyncs the log, one fsync for the whole group"""
+	def sync(self):
+		self.last_sync = time.monotonic()
+		if not self.pending:
+			return
+		self.log.write(b"".join(self.pending))
+		self.log.flush()
+		os.fsync(self.log.fileno())
+		self.pending = []
+
+	"""writes a snapshot of the tree and starts an empty log"""
+	def compact(self):
+		self.sync()
+		tmp_path = os.path.join(self.directory, SNAPSHOT_NAME + ".tmp")
+		with open(tmp_path, "wb") as f:
+			self.tree.dump(f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp_path, os.path.join(self.directory, SNAPSHOT_NAME))
+		fsync_dir(self.directory)
+		# only now the log is redundant
+		self.log.close()
+		self.log = open(self.log_path, "wb")
+		os.fsync(self.log.fileno())
+		self.log_records = 0
+
+	"""syncs the log and closes it"""
+	def close(self):
+		self.sync()
+		self.log.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	"""------------------ reads ------------------"""
+
+	def search(self, key):
+		return self.tree.search(key)
+
+	def finger_search(self, key):
+		return self.tree.finger_search(key)
+
+	def get_root(self):
+		return self.tree.get_root()
+
+	def max_node(self):
+		return self.tree.max_node()
+
+	def size(self):
+		return self.tree.size()
+
+	def items(self, reverse=False):
+		return self.tree.items(reverse)
+
+	def range(self, lo=None, hi=None, reverse=False, lo_inclusive=True, hi_inclusive=False):
+		return self.tree.range(lo, hi, reverse, lo_inclusive, hi_inclusive)
+
+	def avl_to_array(self):
+		return self.tree.avl_to_array()
+
+	def __iter__(self):
+		return iter(self.tree)
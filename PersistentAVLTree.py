@@ -0,0 +1,301 @@
+"""A persistent (path-copying) AVL tree.
+
+Nodes are never changed after they are made. An update copies the O(log n)
+nodes on its search path and returns a new version, every other sub-tree is
+shared with the old version, which stays valid and readable. Holding on to a
+version is therefore an O(1) snapshot.
+
+Nodes have no parent pointers (a shared sub-tree has many parents), so the
+rebalancing walks back up a stack of the nodes passed on the way down.
+"""
+
+"""A class represnting an immutable node in a persistent AVL tree"""
+
+class PersistentNode(object):
+	__slots__ = ("key", "value", "left", "right", "height", "size")
+
+	"""Constructor, a missing child is None
+
+	@type key: int
+	@param key: key of your node
+	@type value: string
+	@param value: data of your node
+	"""
+	def __init__(self, key, value, left=None, right=None):
+		self.key = key
+		self.value = value
+		self.left = left
+		self.right = right
+		self.height = max(height(left), height(right)) + 1
+		self.size = size(left) + size(right) + 1
+
+"""------------------ node functions ------------------"""
+
+"""returns the height of a sub-tree, -1 for None"""
+def height(node):
+	return -1 if node is None else node.height
+
+"""returns the number of nodes in a sub-tree, 0 for None"""
+def size(node):
+	return 0 if node is None else node.size
+
+"""makes a node over left and right, rotating if their heights differ by 2
+
+@pre: left and right are AVL trees whose heights differ by at most 2
+@rtype: PersistentNode
+"""
+def balance(key, value, left, right):
+	hl = height(left)
+	hr = height(right)
+	if hl > hr + 1:
+		if height(left.left) >= height(left.right):
+			# single rotation right
+			return PersistentNode(left.key, left.value, left.left,
+				PersistentNode(key, value, left.right, right))
+		# double rotation
+		mid = left.right
+		return PersistentNode(mid.key, mid.value,
+			PersistentNode(left.key, left.value, left.left, mid.left),
+			PersistentNode(key, value, mid.right, right))
+	if hr > hl + 1:
+		if height(right.right) >= height(right.left):
+			# single rotation left
+			return PersistentNode(right.key, right.value,
+				PersistentNode(key, value, left, right.left), right.right)
+		mid = right.left
+		return PersistentNode(mid.key, mid.value,
+			PersistentNode(key, value, left, mid.left),
+			PersistentNode(right.key, right.value, mid.right, right.right))
+	return PersistentNode(key, value, left, right)
+
+"""rebuilds the search path bottom up over a new sub-tree
+
+@type path: list
+@param path: the nodes from the root down, each with True if the walk went left
+@param sub: the new sub-tree replacing the child below the last node of path
+@rtype: PersistentNode
+"""
+def rebuild(path, sub):
+	while path:
+		node, went_left = path.pop()
+		if went_left:
+			sub = balance(node.key, node.value, sub, node.right)
+		else:
+			sub = balance(node.key, node.value, node.left, sub)
+	return sub
+
+"""joins two sub-trees and a middle item, every key of left < key < every key of right
+
+Only the spine of the higher sub-tree down to the lower one's height is copied.
+
+@rtype: PersistentNode
+"""
+def join_nodes(left, key, value, right):
+	hl = height(left)
+	hr = height(right)
+	path = []
+	if hl > hr + 1:
+		node = left
+		while height(node) > hr + 1:
+			path.append((node, False))
+			node = node.right
+		return rebuild(path, PersistentNode(key, value, node, right))
+	if hr > hl + 1:
+		node = right
+		while height(node) > hl + 1:
+			path.append((node, True))
+			node = node.left
+		return rebuild(path, PersistentNode(key, value, left, node))
+	return PersistentNode(key, value, left, right)
+
+"""removes the minimum of a sub-tree
+
+@pre: node is not None
+@rtype: (PersistentNode, PersistentNode)
+@returns: the minimum node and the new sub-tree without it
+"""
+def pop_min(node):
+	path = []
+	while node.left is not None:
+		path.append((node, True))
+		node = node.left
+	return node, rebuild(path, node.right)
+
+"""
+A class implementing a persistent AVL tree, every instance is one version.
+"""
+
+class PersistentAVLTree(object):
+
+	"""Constructor, an empty tree or a version over an existing root
+
+	@type root: PersistentNode
+	"""
+	def __init__(self, root=None):
+		self.root = root
+
+	"""returns the root of the tree representing the dictionary
+
+	@rtype: PersistentNode
+	@returns: the root, None if the dictionary is empty
+	"""
+	def get_root(self):
+		return self.root
+
+	"""returns the number of items in the dictionary, in O(1)
+
+	@rtype: int
+	"""
+	def size(self):
+		return size(self.root)
+
+	"""returns this version, which no later update can change
+
+	@rtype: PersistentAVLTree
+	"""
+	def snapshot(self):
+		return self
+
+	"""returns the node with the minimal key, None if the dictionary is empty"""
+	def min_node(self):
+		node = self.root
+		while node is not None and node.left is not None:
+			node = node.left
+		return node
+
+	"""returns the node with the maximal key, None if the dictionary is empty"""
+	def max_node(self):
+		node = self.root
+		while node is not None and node.right is not None:
+			node = node.right
+		return node
+
+	"""searches for a node in the dictionary corresponding to the key
+
+	@rtype: (PersistentNode,int)
+	@returns: a tuple (x,e) where x is the node corresponding to key (or None if not found),
+	and e is the number of edges on the path between the root and x+1 (-1 if not found)
+	"""
+	def search(self, key):
+		node = self.root
+		edges = 1
+		while node is not None:
+			if node.key == key:
+				return node, edges
+			node = node.left if key < node.key else node.right
+			edges += 1
+		return None, -1
+
+	"""returns a new version with key set to val, the value is replaced if key exists
+
+	@rtype: PersistentAVLTree
+	"""
+	def insert(self, key, val):
+		path = []
+		node = self.root
+		while node is not None:
+			if node.key == key:
+				return PersistentAVLTree(rebuild(path, PersistentNode(key, val, node.left, node.right)))
+			went_left = key < node.key
+			path.append((node, went_left))
+			node = node.left if went_left else node.right
+		return PersistentAVLTree(rebuild(path, PersistentNode(key, val)))
+
+	"""returns a new version without key, self if key is not in the dictionary
+
+	@rtype: PersistentAVLTree
+	"""
+	def delete(self, key):
+		path = []
+		node = self.root
+		while node is not None and node.key != key:
+			went_left = key < node.key
+			path.append((node, went_left))
+			node = node.left if went_left else node.right
+		if node is None:
+			return self
+		if node.left is None:
+			sub = node.right
+		elif node.right is None:
+			sub = node.left
+		else:
+			# the successor takes the deleted node's place
+			suc, right = pop_min(node.right)
+			sub = balance(suc.key, suc.value, node.left, right)
+		return PersistentAVLTree(rebuild(path, sub))
+
+	"""returns a new version holding self, the item (key, val) and tree2
+
+	@type tree2: PersistentAVLTree
+	@pre: all keys of self are smaller than key and all keys of tree2 are larger, or the other way
+	@rtype: PersistentAVLTree
+	"""
+	def join(self, tree2, key, val):
+		# either side may be empty, so the order is read off whichever root exists
+		if (self.root is not None and self.root.key > key) or \
+			(tree2.root is not None and tree2.root.key < key):
+			return PersistentAVLTree(join_nodes(tree2.root, key, val, self.root))
+		return PersistentAVLTree(join_nodes(self.root, key, val, tree2.root))
+
+	"""splits the dictionary at key, self stays valid
+
+	@rtype: (PersistentAVLTree, PersistentNode, PersistentAVLTree)
+	@returns: the version with the keys smaller than key, the node of key
+	(None if not found), and the version with the larger keys
+	"""
+	def split(self, key):
+		path = []
+		node = self.root
+		while node is not None and node.key != key:
+			went_left = key < node.key
+			path.append((node, went_left))
+			node = node.left if went_left else node.right
+		left = None if node is None else node.left
+		right = None if node is None else node.right
+		# bottom up, each step joins pieces of growing height, O(log n) in total
+		while path:
+			parent, went_left = path.pop()
+			if went_left:
+				right = join_nodes(right, parent.key, parent.value, parent.right)
+			else:
+				left = join_nodes(parent.left, parent.key, parent.value, left)
+		return PersistentAVLTree(left), node, PersistentAVLTree(right)
+
+	"""yields the (key, value) pairs with lo <= key < hi in key order
+
+	@param lo: the lower bound, None for no bound
+	@param hi: the upper bound, None for no bound
+	"""
+	def range(self, lo=None, hi=None):
+		stack = []
+		node = self.root
+		while True:
+			# go left as far as keys can still be in range
+			while node is not None:
+				if lo is not None and node.key < lo:
+					node = node.right
+				else:
+					stack.append(node)
+					node = node.left
+			if not stack:
+				return
+			node = stack.pop()
+			if hi is not None and node.key >= hi:
+				return
+			yield (node.key, node.value)
+			node = node.right
+
+	"""yields (key, value) pairs in key order"""
+	def items(self):
+		return self.range()
+
+	"""returns a sorted list of (key, value) pairs
+
+	@rtype: list
+	"""
+	def avl_to_array(self):
+		return list(self.items())
+
+	def __iter__(self):
+		for key, value in self.range():
+			yield key
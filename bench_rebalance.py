@@ -0,0 +1,32 @@
+"""
+Per-insert cost of insert and finger_insert on sorted and random inputs,
+the workloads of theory.py and test3.py.
+Run: python3 bench_rebalance.py [n]
+"""
+
+import random
+import sys
+import time
+from AVLTree import AVLTree
+
+def time_inserts(keys, finger):
+	T = AVLTree()
+	ins = T.finger_insert if finger else T.insert
+	promotes = 0
+	start = time.perf_counter()
+	for k in keys:
+		promotes += ins(k, str(k))[2]
+	elapsed = time.perf_counter() - start
+	return elapsed, promotes
+
+if __name__ == "__main__":
+	n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+	random.seed(0)
+	shuffled = list(range(n))
+	random.shuffle(shuffled)
+	workloads = [("sorted", list(range(n))), ("random", shuffled)]
+	for name, keys in workloads:
+		for finger in (False, True):
+			elapsed, promotes = time_inserts(keys, finger)
+			op = "finger_insert" if finger else "insert"
+			print(f"{name:7} {op:13} n = {n}: {elapsed / n * 1e6:.2f} us/insert, promotes: {promotes}")
@@ -0,0 +1,33 @@
+"""
+Cost of split (and of the join that undoes it) at random pivots.
+Run: python3 bench_split.py [n] [splits]
+"""
+
+import random
+import sys
+import time
+from AVLTree import AVLTree
+
+def time_splits(n, splits, augmented):
+	T = AVLTree.from_sorted(((i, str(i)) for i in range(n)), n, size_augmented=augmented)
+	split_time = 0.0
+	join_time = 0.0
+	for pivot in random.sample(range(n), splits):
+		node = T.search(pivot)[0]
+		start = time.perf_counter()
+		left, right = T.split(node)
+		split_time += time.perf_counter() - start
+		start = time.perf_counter()
+		left.join(right, pivot, str(pivot))
+		join_time += time.perf_counter() - start
+		T = left
+	return split_time / splits, join_time / splits
+
+if __name__ == "__main__":
+	n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+	splits = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+	random.seed(0)
+	for augmented in (False, True):
+		split_t, join_t = time_splits(n, splits, augmented)
+		mode = "size augmented" if augmented else "plain"
+		print(f"{mode:14} n = {n}: split {split_t * 1e6:.1f} us, join {join_t * 1e6:.1f} us")
@@ -0,0 +1,328 @@
+"""
+Benchmark suite for the AVL engines, replacing the print loops of theory.py and test3.py.
+
+Every engine (AVLTree, AVLArrayTree and a sorted list kept with bisect as the
+baseline) is timed on four input orders (ascending, descending, random and
+partially shuffled) for n = 2^min_exp .. 2^max_exp. The results are written as
+JSON, and compare mode flags the operations that got slower than a saved run.
+insert_many and insert_loop insert the same batch of new keys into a tree of the
+input's keys, once with AVLTree.insert_many and once with an upsert per key.
+
+Run:     python3 benchmark.py run [--min-exp 10] [--max-exp 22] [--out results.json]
+Compare: python3 benchmark.py compare baseline.json results.json [--threshold 0.1]
+A quick run: python3 benchmark.py run --max-exp 14 --step 2
+"""
+
+import argparse
+import bisect
+import json
+import platform
+import random
+import sys
+import time
+from AVLTree import AVLTree
+from AVLArrayTree import AVLArrayTree
+
+ORDERS = ("ascending", "descending", "random", "partial")
+OPS = ("insert", "finger_insert", "search", "finger_search", "iteration", "split", "join", "delete",
+	"insert_many", "insert_loop")
+# searches, finger searches and splits are sampled, n of them would dominate the large runs
+MAX_QUERIES = 100000
+MAX_SPLITS = 1000
+# the chance each adjacent pair is swapped in the partially shuffled order, as in test3.py
+PARTIAL_SWAP_PROBABILITY = 0.5
+
+"""------------------ inputs ------------------"""
+
+"""returns the keys 0..n-1 in one of ORDERS, the same for the same seed"""
+def make_keys(order, n, rng):
+	keys = list(range(n))
+	if order == "descending":
+		keys.reverse()
+	elif order == "random":
+		rng.shuffle(keys)
+	elif order == "partial":
+		for i in range(n - 1):
+			if rng.random() < PARTIAL_SWAP_PROBABILITY:
+				keys[i], keys[i + 1] = keys[i + 1], keys[i]
+	return keys
+
+"""------------------ engines ------------------"""
+
+"""Each engine times the operations it supports on one input, returning seconds per operation.
+An operation an engine does not have is left out of its results.
+"""
+
+class AVLTreeEngine(object):
+	name = "AVLTree"
+	tree_class = AVLTree
+
+	def build(self, keys, finger):
+		tree = self.tree_class()
+		ins = tree.finger_insert if finger else tree.insert
+		start = time.perf_counter()
+		for k in keys:
+			ins(k, k)
+		return tree, time.perf_counter() - start
+
+	def search(self, tree, queries):
+		search = tree.search
+		start = time.perf_counter()
+		for k in queries:
+			search(k)
+		return time.perf_counter() - start
+
+	def finger_search(self, tree, queries):
+		search = tree.finger_search
+		start = time.perf_counter()
+		for k in queries:
+			search(k)
+		return time.perf_counter() - start
+
+	def iteration(self, tree):
+		start = time.perf_counter()
+		for item in tree.items():
+			pass
+		return time.perf_counter() - start
+
+	"""splits at every pivot and joins the halves back, returning both times"""
+	def split_join(self, tree, pivots):
+		split_time = join_time = 0.0
+		for pivot in pivots:
+			node = tree.search(pivot)[0]
+			start = time.perf_counter()
+			left, right = tree.split(node)
+			split_time += time.perf_counter() - start
+			start = time.perf_counter()
+			left.join(right, pivot, pivot)
+			join_time += time.perf_counter() - start
+			tree = left
+		return tree, split_time, join_time
+
+	"""deletes every key, the search for the node included"""
+	def delete(self, tree, keys):
+		start = time.perf_counter()
+		for k in keys:
+			tree.delete(tree.search(k)[0])
+		return time.perf_counter() - start
+
+	"""inserts a sampled batch of new keys into a tree of keys, once with insert_many
+	and once key by key, returning both times"""
+	def batch_insert(self, keys, batch):
+		base = [(k, k) for k in sorted(keys)]
+		tree = AVLTree.from_sorted(base)
+		start = time.perf_counter()
+		tree.insert_many(batch)
+		many_time = time.perf_counter() - start
+		tree = AVLTree.from_sorted(base)
+		start = time.perf_counter()
+		for k, v in batch:
+			tree.upsert(k, v)
+		return many_time, time.perf_counter() - start
+
+class AVLArrayEngine(AVLTreeEngine):
+	name = "AVLArrayTree"
+	tree_class = AVLArrayTree
+	finger_search = None
+	batch_insert = None
+
+	def iteration(self, tree):
+		start = time.perf_counter()
+		for item in tree.avl_to_array():
+			pass
+		return time.perf_counter() - start
+
+"""A sorted key list and a parallel value list, kept with bisect"""
+
+class BisectEngine(object):
+	name = "bisect"
+	finger_search = None
+	batch_insert = None
+
+	def build(self, keys, finger):
+		if finger:
+			return None, None
+		sorted_keys = []
+		values = []
+		start = time.perf_counter()
+		for k in keys:
+			i = bisect.bisect_left(sorted_keys, k)
+			sorted_keys.insert(i, k)
+			values.insert(i, k)
+		return (sorted_keys, values), time.perf_counter() - start
+
+	def search(self, tree, queries):
+		sorted_keys, values = tree
+		start = time.perf_counter()
+		for k in queries:
+			i = bisect.bisect_left(sorted_keys, k)
+			if i < len(sorted_keys) and sorted_keys[i] == k:
+				values[i]
+		return time.perf_counter() - start
+
+	def iteration(self, tree):
+		start = time.perf_counter()
+		for item in zip(*tree):
+			pass
+		return time.perf_counter() - start
+
+	def split_join(self, tree, pivots):
+		split_time = join_time = 0.0
+		for pivot in pivots:
+			sorted_keys, values = tree
+			start = time.perf_counter()
+			i = bisect.bisect_left(sorted_keys, pivot)
+			left = (sorted_keys[:i], values[:i])
+			right = (sorted_keys[i + 1:], values[i + 1:])
+			split_time += time.perf_counter() - start
+			start = time.perf_counter()
+			tree = (left[0] + [pivot] + right[0], left[1] + [pivot] + right[1])
+			join_time += time.perf_counter() - start
+		return tree, split_time, join_time
+
+	def delete(self, tree, keys):
+		sorted_keys, values = tree
+		start = time.perf_counter()
+		for k in keys:
+			i = bisect.bisect_left(sorted_keys, k)
+			del sorted_keys[i]
+			del values[i]
+		return time.perf_counter() - start
+
+ENGINES = {e.name: e for e in (AVLTreeEngine(), AVLArrayEngine(), BisectEngine())}
+
+"""------------------ running ------------------"""
+
+"""times every operation of engine on one input
+
+@rtype: dict
+@returns: seconds per operation, by operation name
+"""
+def run_one(engine, keys, rng):
+	n = len(keys)
+	times = {}
+	tree, elapsed = engine.build(keys, True)
+	if tree is not None:
+		times["finger_insert"] = elapsed / n
+	tree, elapsed = engine.build(keys, False)
+	times["insert"] = elapsed / n
+	queries = rng.sample(keys, min(n, MAX_QUERIES))
+	times["search"] = engine.search(tree, queries) / len(queries)
+	if engine.finger_search is not None:
+		times["finger_search"] = engine.finger_search(tree, queries) / len(queries)
+	times["iteration"] = engine.iteration(tree) / n
+	pivots = rng.sample(keys, min(n, MAX_SPLITS))
+	tree, split_time, join_time = engine.split_join(tree, pivots)
+	times["split"] = split_time / len(pivots)
+	times["join"] = join_time / len(pivots)
+	times["delete"] = engine.delete(tree, keys) / n
+	if engine.batch_insert is not None:
+		# new keys between the existing ones, in random order
+		batch = [(k + 0.5, k) for k in rng.sample(keys, min(n, MAX_QUERIES))]
+		many_time, loop_time = engine.batch_insert(keys, batch)
+		times["insert_many"] = many_time / len(batch)
+		times["insert_loop"] = loop_time / len(batch)
+	return times
+
+"""runs the suite
+
+@rtype: dict
+@returns: the JSON document, meta data and a list of result records
+"""
+def run(engines, orders, exps, bisect_max_exp, repeat, seed):
+	results = []
+	for exp in exps:
+		n = 2 ** exp
+		for order in orders:
+			keys = make_keys(order, n, random.Random(seed))
+			for name in engines:
+				if name == "bisect" and exp > bisect_max_exp:
+					continue
+				best = {}
+				for r in range(repeat):
+					# the same queries and pivots on every engine and repeat
+					for op, t in run_one(ENGINES[name], keys, random.Random(seed + 1)).items():
+						best[op] = min(best.get(op, t), t)
+				for op in OPS:
+					if op in best:
+						results.append({"engine": name, "order": order, "n": n, "op": op,
+							"ns_per_op": round(best[op] * 1e9, 1)})
+				print(f"{name:12} {order:10} n = 2^{exp}: " +
+					", ".join(f"{op} {best[op] * 1e9:.0f}" for op in OPS if op in best) + " ns/op",
+					file=sys.stderr)
+	add_baseline_ratios(results)
+	return {"meta": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+		"machine": platform.machine(), "seed": seed, "repeat": repeat,
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S")}, "results": results}
+
+"""adds vs_bisect, the time relative to the bisect baseline on the same input, where it was run"""
+def add_baseline_ratios(results):
+	baseline = {(r["order"], r["n"], r["op"]): r["ns_per_op"] for r in results if r["engine"] == "bisect"}
+	for r in results:
+		base = baseline.get((r["order"], r["n"], r["op"]))
+		if base and r["engine"] != "bisect":
+			r["vs_bisect"] = round(r["ns_per_op"] / base, 3)
+
+"""------------------ comparing ------------------"""
+
+"""returns the records of current that are slower than in baseline by more than threshold
+
+@type threshold: float
+@param threshold: the allowed relative slowdown, 0.1 for 10%
+@rtype: list
+@returns: (record, baseline ns_per_op, ratio) tuples, the worst first
+"""
+def compare(baseline, current, threshold):
+	before = {(r["engine"], r["order"], r["n"], r["op"]): r["ns_per_op"] for r in baseline["results"]}
+	regressions = []
+	for r in current["results"]:
+		old = before.get((r["engine"], r["order"], r["n"], r["op"]))
+		if old and r["ns_per_op"] > old * (1 + threshold):
+			regressions.append((r, old, r["ns_per_op"] / old))
+	regressions.sort(key=lambda reg: -reg[2])
+	return regressions
+
+def main(argv):
+	parser = argparse.ArgumentParser(description="AVL engine benchmarks")
+	sub = parser.add_subparsers(dest="command", required=True)
+	run_parser = sub.add_parser("run", help="run the suite and write JSON results")
+	run_parser.add_argument("--min-exp", type=int, default=10)
+	run_parser.add_argument("--max-exp", type=int, default=22)
+	run_parser.add_argument("--step", type=int, default=1)
+	run_parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), default=list(ENGINES))
+	run_parser.add_argument("--orders", nargs="+", choices=ORDERS, default=list(ORDERS))
+	run_parser.add_argument("--bisect-max-exp", type=int, default=18,
+		help="the list baseline has O(n) inserts, larger sizes are skipped")
+	run_parser.add_argument("--repeat", type=int, default=3, help="the best of this many runs is kept")
+	run_parser.add_argument("--seed", type=int, default=0)
+	run_parser.add_argument("--out", default="-", help="the JSON file, - for stdout")
+	cmp_parser = sub.add_parser("compare", help="flag regressions against a saved baseline")
+	cmp_parser.add_argument("baseline")
+	cmp_parser.add_argument("current")
+	cmp_parser.add_argument("--threshold", type=float, default=0.1)
+	args = parser.parse_args(argv)
+
+	if args.command == "run":
+		exps = range(args.min_exp, args.max_exp + 1, args.step)
+		doc = run(args.engines, args.orders, exps, args.bisect_max_exp, args.repeat, args.seed)
+		text = json.dumps(doc, indent=1)
+		if args.out == "-":
+			print(text)
+		else:
+			with open(args.out, "w") as f:
+				f.write(text)
+		return 0
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	with open(args.current) as f:
+		current = json.load(f)
+	regressions = compare(baseline, current, args.threshold)
+	for r, old, ratio in regressions:
+		print(f"REGRESSION {r['engine']:12} {r['order']:10} n = {r['n']:8} {r['op']:13} "
+			f"{old:.0f} -> {r['ns_per_op']:.0f} ns/op ({ratio:.2f}x)")
+	if not regressions:
+		print(f"no regressions above {args.threshold:.0%}")
+	return 1 if regressions else 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -1,5 +1,38 @@
+import io
+import pickle
+import random
 import AVLTree
 
+def assert_valid_avl(tree):
+    """Check order, parent pointers, heights and balance of every node"""
+    stack = [(tree.root, None, None)]
+    count = 0
+    while stack:
+        node, lo, hi = stack.pop()
+        if not node.is_real_node():
+            continue
+        count += 1
+        assert lo is None or node.key > lo, f"Key {node.key} out of order"
+        assert hi is None or node.key < hi, f"Key {node.key} out of order"
+        for child in (node.left, node.right):
+            assert not child.is_real_node() or child.parent is node, f"Bad parent under {node.key}"
+        assert node.height == max(node.left.height, node.right.height) + 1, f"Bad height at {node.key}"
+        assert abs(node.left.height - node.right.height) <= 1, f"Unbalanced at {node.key}"
+        stack.append((node.left, lo, node.key))
+        stack.append((node.right, node.key, hi))
+    assert count == tree.size(), f"Size is {tree.size()}, counted {count}"
+    if count:
+        node = tree.root
+        while node.left.is_real_node():
+            node = node.left
+        assert tree.min_node() is node, "The min pointer is stale"
+        node = tree.root
+        while node.right.is_real_node():
+            node = node.right
+        assert tree.max_node() is node, "The max pointer is stale"
+    else:
+        assert tree.min_node() is None and tree.max_node() is None
+
 def test_basic_operations():
     """Test basic insert and search operations"""
     print("=" * 50)
@@ -367,6 +400,746 @@ def test_finger_search():
     assert result is None, "Finger search should not find 100"
     print("✓ Finger search doesn't find non-existent key")
 
+def test_shared_sentinel():
+    """Test that every virtual leaf is the tree's single sentinel"""
+    print("\n" + "=" * 50)
+    print("TEST 15: Shared Virtual Sentinel")
+    print("=" * 50)
+    
+    tree = AVLTree.AVLTree()
+    for val in [10, 5, 15, 3, 7, 12, 20]:
+        tree.insert(val, str(val))
+    tree.finger_insert(25, "25")
+    
+    leaf = tree.search(3)[0]
+    assert leaf.left is tree.virtual and leaf.right is tree.virtual, "Leaves should share the sentinel"
+    assert leaf.is_leaf(), "3 should be a leaf"
+    assert not tree.virtual.is_real_node(), "Sentinel should be virtual"
+    print("✓ Virtual leaves are the shared sentinel")
+    
+    try:
+        tree.virtual.key = 1
+        assert False, "Sentinel should be immutable"
+    except AttributeError:
+        pass
+    print("✓ Sentinel is immutable")
+    
+    tree.delete(tree.search(10)[0])
+    tree.delete(tree.search(3)[0])
+    keys = [pair[0] for pair in tree.avl_to_array()]
+    assert keys == [5, 7, 12, 15, 20, 25], f"Unexpected keys {keys}"
+    assert tree.search(100) == (None, -1), "Miss should return (None, -1)"
+    print("✓ Delete and search work with the sentinel")
+    
+    legacy = AVLTree.AVLTree(shared_sentinel=False)
+    legacy.insert(1, "1")
+    legacy.insert(2, "2")
+    assert legacy.virtual is None and legacy.search(2)[0].left is not legacy.search(1)[0].left
+    print("✓ Legacy mode allocates fresh virtual leaves")
+
+def test_memory_usage():
+    """Test the slotted node and the memory report"""
+    print("\n" + "=" * 50)
+    print("TEST 16: Memory Usage Report")
+    print("=" * 50)
+    
+    tree = AVLTree.AVLTree()
+    assert tree.memory_usage()["nodes"] == 0, "Empty tree should have no real nodes"
+    for i in range(100):
+        tree.insert(i, str(i))
+    
+    node = tree.get_root()
+    assert not hasattr(node, "__dict__"), "AVLNode should not have a __dict__"
+    print("✓ AVLNode is slotted")
+    
+    report = tree.memory_usage()
+    assert report["nodes"] == 100, f"Expected 100 nodes, got {report['nodes']}"
+    assert report["virtual_nodes"] == 1, "Only the shared sentinel should be virtual"
+    assert report["bytes_per_key"] == report["node_bytes"] / 100
+    print(f"✓ {report['bytes_per_key']:.1f} bytes per key")
+    
+    sized = AVLTree.AVLTree(size_augmented=True)
+    for i in range(100):
+        sized.insert(i, str(i))
+    assert not hasattr(node, "size"), "Plain nodes should not carry a size"
+    assert sized.get_root().size == 100
+    assert sized.memory_usage()["bytes_per_key"] > report["bytes_per_key"]
+    sized.union(tree)
+    assert_valid_avl(sized)
+    assert sized.select(50).key == 50 and sized.size() == 100
+    print("✓ Only size augmented nodes carry a size")
+
+def test_rebalance_random():
+    """Test heights and balance through random inserts and deletes"""
+    print("\n" + "=" * 50)
+    print("TEST 17: Random Inserts and Deletes Stay Balanced")
+    print("=" * 50)
+    
+    random.seed(17)
+    for trial in range(50):
+        tree = AVLTree.AVLTree()
+        keys = random.sample(range(500), 80)
+        for i, k in enumerate(keys):
+            if i % 2:
+                tree.insert(k, str(k))
+            else:
+                tree.finger_insert(k, str(k))
+        assert_valid_avl(tree)
+        random.shuffle(keys)
+        for k in keys[:60]:
+            tree.delete(tree.search(k)[0])
+            assert_valid_avl(tree)
+        remaining = sorted(keys[60:])
+        assert [pair[0] for pair in tree.avl_to_array()] == remaining
+        assert tree.max_node().key == remaining[-1]
+    print("✓ 50 random trees stayed valid")
+    
+    # promote counts on sorted input, as in theory.py
+    tree = AVLTree.AVLTree()
+    promotes = sum(tree.finger_insert(i, str(i))[2] for i in range(1000))
+    assert promotes == 1994, f"Expected 1994 promotes, got {promotes}"
+    print("✓ Promote count on sorted input")
+
+def test_iterators():
+    """Test lazy in-order iteration in both directions"""
+    print("\n" + "=" * 50)
+    print("TEST 18: Iterators")
+    print("=" * 50)
+    
+    tree = AVLTree.AVLTree()
+    assert list(tree) == [] and list(tree.reversed()) == [], "Empty tree should yield nothing"
+    values = [15, 3, 20, 1, 7, 12, 25, 30, 5]
+    for val in values:
+        tree.insert(val, str(val))
+    
+    assert list(tree) == sorted(values), "Keys should come in order"
+    assert list(tree.keys()) == sorted(values)
+    assert list(tree.values()) == [str(v) for v in sorted(values)]
+    assert list(tree.items()) == tree.avl_to_array()
+    print("✓ Forward iteration")
+    
+    assert list(reversed(tree)) == sorted(values, reverse=True)
+    assert list(tree.reversed()) == tree.avl_to_array()[::-1]
+    assert list(tree.values(reverse=True)) == [str(v) for v in sorted(values, reverse=True)]
+    print("✓ Reverse iteration")
+    
+    items = tree.items()
+    assert next(items) == (1, "1") and next(items) == (3, "3"), "Items should be lazy"
+    print("✓ Iteration is lazy")
+
+def test_range():
+    """Test range scans with inclusive and exclusive bounds"""
+    print("\n" + "=" * 50)
+    print("TEST 19: Range Queries")
+    print("=" * 50)
+    
+    tree = AVLTree.AVLTree()
+    for val in range(0, 100, 5):
+        tree.insert(val, str(val))
+    
+    assert [k for k, v in tree.range(10, 30)] == [10, 15, 20, 25], "lo <= key < hi"
+    assert [k for k, v in tree.range(11, 30, hi_inclusive=True)] == [15, 20, 25, 30]
+    assert [k for k, v in tree.range(10, 30, lo_inclusive=False)] == [15, 20, 25]
+    assert [k for k, v in tree.range(10, 30, reverse=True)] == [25, 20, 15, 10]
+    assert [k for k, v in tree.range(None, 12)] == [0, 5, 10]
+    assert [k for k, v in tree.range(88)] == [90, 95]
+    assert list(tree.range(200, 300)) == [] and list(tree.range(30, 10)) == []
+    print("✓ Range scans")
+    
+    assert tree.count_range(10, 30) == 4
+    assert tree.count_range(10, 30, lo_inclusive=False, hi_inclusive=True) == 4
+    assert tree.count_range() == 20
+    assert AVLTree.AVLTree().count_range(0, 10) == 0
+    print("✓ Range counts")
+
+def test_from_sorted():
+    """Test O(n) bulk construction from sorted items"""
+    print("\n" + "=" * 50)
+    print("TEST 20: Bulk Build From Sorted Items")
+    print("=" * 50)
+    
+    for n in [0, 1, 2, 3, 7, 8, 100, 1000]:
+        tree = AVLTree.AVLTree.from_sorted([(i, str(i)) for i in range(n)])
+        assert_valid_avl(tree)
+        assert list(tree) == list(range(n)), f"Wrong keys for n = {n}"
+        if n:
+            assert tree.max_node().key == n - 1
+            assert tree.get_root().height == n.bit_length() - 1, "Tree should be perfectly balanced"
+    print("✓ Built trees are valid and balanced")
+    
+    gen = ((i, str(i)) for i in range(10, 60))
+    tree = AVLTree.AVLTree.from_sorted(gen, 50)
+    assert tree.size() == 50 and tree.max_node().key == 59
+    tree.insert(5, "5")
+    tree.finger_insert(70, "70")
+    tree.delete(tree.search(30)[0])
+    assert_valid_avl(tree)
+    print("✓ Generator input with known length")
+
+def test_split_join():
+    """Test split and join on random trees"""
+    print("\n" + "=" * 50)
+    print("TEST 21: Split and Join")
+    print("=" * 50)
+    
+    random.seed(21)
+    for trial in range(30):
+        keys = sorted(random.sample(range(1000), random.randint(1, 100)))
+        tree = AVLTree.AVLTree()
+        for k in random.sample(keys, len(keys)):
+            tree.insert(k, str(k))
+        pivot = random.choice(keys)
+        left, right = tree.split(tree.search(pivot)[0])
+        assert_valid_avl(left)
+        assert_valid_avl(right)
+        assert list(left) == [k for k in keys if k < pivot]
+        assert list(right) == [k for k in keys if k > pivot]
+        if right.size():
+            assert right.max_node().key == keys[-1]
+        if left.size():
+            assert left.max_node().key == max(k for k in keys if k < pivot)
+        left.join(right, pivot, str(pivot))
+        assert_valid_avl(left)
+        assert list(left) == keys and left.max_node().key == keys[-1]
+    print("✓ Split and join back on 30 random trees")
+    
+    small = AVLTree.AVLTree()
+    big = AVLTree.AVLTree()
+    small.insert(1, "1")
+    for i in range(10, 40):
+        big.insert(i, str(i))
+    small.join(big, 5, "5")
+    assert_valid_avl(small)
+    assert list(small) == [1, 5] + list(range(10, 40)) and big.size() == 0
+    print("✓ Join of trees with different heights")
+
+def test_insert_many():
+    """Test batched inserts merged with split and join"""
+    print("\n" + "=" * 50)
+    print("TEST 22: Batched Insert")
+    print("=" * 50)
+    
+    random.seed(22)
+    tree = AVLTree.AVLTree()
+    expected = {}
+    for k in random.sample(range(5000), 500):
+        tree.insert(k, "old")
+        expected[k] = "old"
+    batch = [(random.randrange(5000), "new") for i in range(400)]
+    added = tree.insert_many(batch)
+    expected.update(dict(batch))
+    assert_valid_avl(tree)
+    assert added == len(expected) - 500, "Returned count should only cover new keys"
+    assert tree.avl_to_array() == sorted(expected.items())
+    assert tree.max_node().key == max(expected)
+    print("✓ Batch merged, existing keys updated")
+    
+    empty = AVLTree.AVLTree()
+    assert empty.insert_many([(3, "a"), (1, "b"), (3, "c")]) == 2
+    assert empty.avl_to_array() == [(1, "b"), (3, "c")]
+    assert empty.insert_many([]) == 0
+    print("✓ Batch into an empty tree")
+
+def test_select_rank():
+    """Test select, rank and indexing in a size augmented tree"""
+    print("\n" + "=" * 50)
+    print("TEST 23: Select and Rank")
+    print("=" * 50)
+    
+    random.seed(23)
+    keys = random.sample(range(1000), 200)
+    tree = AVLTree.AVLTree(size_augmented=True)
+    for k in keys:
+        tree.insert(k, str(k))
+    for k in keys[:50]:
+        tree.delete(tree.search(k)[0])
+    remaining = sorted(keys[50:])
+    
+    for i, k in enumerate(remaining):
+        assert tree.select(i).key == k, f"select({i}) should be {k}"
+        assert tree.rank(k) == i, f"rank({k}) should be {i}"
+    assert tree.select(len(remaining)) is None
+    assert tree[0] == (remaining[0], str(remaining[0])) and tree[-1][0] == remaining[-1]
+    assert tree.rank(-1) == 0 and tree.rank(5000) == len(remaining)
+    print("✓ select, rank and indexing")
+    
+    left, right = tree.split(tree.search(remaining[70])[0])
+    assert left.size() == 70 and right.select(0).key == remaining[71]
+    left.join(right, remaining[70], "x")
+    assert left.rank(remaining[100]) == 100
+    assert left.count_range(remaining[10], remaining[20]) == 10
+    print("✓ Sizes survive split and join")
+    
+    try:
+        AVLTree.AVLTree().select(0)
+        assert False, "select should need a size augmented tree"
+    except ValueError:
+        pass
+    print("✓ Plain trees refuse select")
+
+def test_set_operations():
+    """Test union, intersection and differences of trees"""
+    print("\n" + "=" * 50)
+    print("TEST 24: Set Operations")
+    print("=" * 50)
+    
+    def make(keys, tag):
+        tree = AVLTree.AVLTree()
+        for k in keys:
+            tree.insert(k, tag)
+        return tree
+    
+    random.seed(24)
+    a_keys = set(random.sample(range(400), 120))
+    b_keys = set(random.sample(range(400), 60))
+    common = len(a_keys & b_keys)
+    
+    tree = make(a_keys, "a")
+    assert tree.union(make(b_keys, "b")) == common
+    assert_valid_avl(tree)
+    assert list(tree) == sorted(a_keys | b_keys)
+    assert all(v == "a" for k, v in tree.items() if k in a_keys), "self's values win by default"
+    print("✓ Union")
+    
+    tree = make(a_keys, "a")
+    tree.intersection(make(b_keys, "b"), prefer="other")
+    assert_valid_avl(tree)
+    assert tree.avl_to_array() == [(k, "b") for k in sorted(a_keys & b_keys)]
+    print("✓ Intersection")
+    
+    tree = make(a_keys, "a")
+    tree.difference(make(b_keys, "b"))
+    assert_valid_avl(tree)
+    assert list(tree) == sorted(a_keys - b_keys)
+    tree = make(a_keys, "a")
+    tree.symmetric_difference(make(b_keys, "b"))
+    assert_valid_avl(tree)
+    assert list(tree) == sorted(a_keys ^ b_keys)
+    print("✓ Difference and symmetric difference")
+    
+    tree = make([1, 2, 3], 1)
+    tree.union(make([3, 4], 10), prefer=lambda key, mine, theirs: mine + theirs)
+    assert tree.avl_to_array() == [(1, 1), (2, 1), (3, 11), (4, 10)]
+    print("✓ Custom collision policy")
+    
+    plain = make([1, 2], "a")
+    augmented = AVLTree.AVLTree(size_augmented=True)
+    for k in (2, 3, 4):
+        augmented.insert(k, "b")
+    plain.union(augmented)
+    assert augmented.augmented and augmented.size() == 0, "other keeps its mode"
+    augmented.insert(7, "c")
+    augmented.insert(5, "c")
+    assert augmented.select(1).key == 7
+    print("✓ Other keeps its mode")
+    
+    for op, kept in (("union", 10), ("intersection", 10), ("difference", 0), ("symmetric_difference", 0)):
+        tree = make(range(10), "a")
+        assert getattr(tree, op)(tree) == 10
+        assert tree.size() == kept and len(list(tree)) == kept, op
+        assert_valid_avl(tree)
+    print("✓ A tree combined with itself")
+
+def test_dump_load():
+    """Test binary dump, load and pickling"""
+    print("\n" + "=" * 50)
+    print("TEST 25: Dump and Load")
+    print("=" * 50)
+    
+    tree = AVLTree.AVLTree(size_augmented=True)
+    for i in range(3000):
+        tree.insert(i * 7 - 5000, str(i))
+    tree.insert(2 ** 70, b"big")
+    tree.insert(-2 ** 70, 1.5)
+    tree.insert(10 ** 6, ("any", "object"))
+    out = io.BytesIO()
+    written = tree.dump(out)
+    assert written == len(out.getvalue())
+    out.seek(0)
+    loaded = AVLTree.AVLTree.load(out)
+    assert_valid_avl(loaded)
+    assert loaded.avl_to_array() == tree.avl_to_array()
+    assert loaded.augmented and loaded.select(5).key == tree.select(5).key
+    assert loaded.max_node().key == 2 ** 70
+    print("✓ Dump and load round trip")
+    
+    copy = pickle.loads(pickle.dumps(tree))
+    assert copy.avl_to_array() == tree.avl_to_array()
+    empty = pickle.loads(pickle.dumps(AVLTree.AVLTree()))
+    assert empty.get_root() is None and empty.size() == 0
+    print("✓ Pickle uses the dump")
+    
+    for bad in (b"", b"XXXX" + out.getvalue()[4:], out.getvalue()[:-3]):
+        try:
+            AVLTree.AVLTree.load(io.BytesIO(bad))
+            assert False, "A bad dump should raise"
+        except ValueError:
+            pass
+    print("✓ Bad dumps raise ValueError")
+    
+    stream = io.BytesIO()
+    second = AVLTree.AVLTree.from_sorted([(k, str(k)) for k in range(5)])
+    tree.dump(stream)
+    AVLTree.AVLTree().dump(stream)
+    second.dump(stream)
+    stream.write(b"trailer")
+    stream.seek(0)
+    assert AVLTree.AVLTree.load(stream).avl_to_array() == tree.avl_to_array()
+    assert AVLTree.AVLTree.load(stream).size() == 0
+    assert AVLTree.AVLTree.load(stream).avl_to_array() == second.avl_to_array()
+    assert stream.read() == b"trailer", "load stops at the end of its dump"
+    print("✓ Dumps back to back in one stream")
+
+def test_stats():
+    """Test the operation counters"""
+    print("\n" + "=" * 50)
+    print("TEST 26: Operation Statistics")
+    print("=" * 50)
+    
+    tree = AVLTree.AVLTree()
+    assert tree.stats is None
+    stats = tree.enable_stats()
+    promotes = edges = 0
+    for i in range(100):
+        node, e, p = tree.insert(i, str(i))
+        edges += e
+        promotes += p
+    assert stats.inserts == 100 and stats.promotes == promotes and stats.comparisons == edges
+    # sorted inserts only ever need single rotations of one kind
+    kinds = {k: v for k, v in stats.snapshot().items() if "rotation" in k and v}
+    assert list(kinds) == ["single_rotation_left_ins"] and stats.rotations() == kinds["single_rotation_left_ins"]
+    print(f"✓ Insert counters: {stats.rotations()} rotations")
+    
+    small = AVLTree.AVLTree()
+    small_stats = small.enable_stats()
+    small.insert(1, "1")
+    small.insert(2, "2")
+    # the new root alone, then one edge down and a climb through 2 and the root
+    assert small_stats.nodes_visited == 1 + 1 + 2
+    small.insert(3, "3")
+    # two edges down, 3 then 2 walked before the rotation balances the tree
+    assert small_stats.nodes_visited == 4 + 2 + 2
+    
+    stats.reset()
+    node, e = tree.search(50)
+    tree.search(1000)
+    assert stats.searches == 2 and stats.comparisons >= e
+    for i in range(0, 60):
+        tree.delete(tree.search(i)[0])
+    assert stats.deletes == 60 and stats.searches == 62
+    assert sum(stats.snapshot()[k] for k in stats.FIELDS if k.endswith("_del")) > 0
+    print("✓ Search and delete counters")
+    
+    left, found, right = tree.split_key(80)
+    assert stats.splits == 1 and left.stats is stats
+    left.join(right, 80, "80")
+    assert stats.joins == 1 and stats.rotations() > 0
+    left.disable_stats()
+    left.insert(1000, "1000")
+    assert left.stats is None and stats.inserts == 0
+    print("✓ Split and join counters")
+
+def test_cursor():
+    """Test the cursor and finger seeks"""
+    print("\n" + "=" * 50)
+    print("TEST 27: Cursor")
+    print("=" * 50)
+    
+    random.seed(20)
+    keys = sorted(random.sample(range(0, 5000, 2), 800))
+    tree = AVLTree.AVLTree()
+    for k in random.sample(keys, len(keys)):
+        tree.insert(k, str(k))
+    cur = tree.cursor()
+    seen = [cur.key()]
+    while cur.next() is not None:
+        seen.append(cur.key())
+    assert seen == keys and not cur.valid()
+    cur = AVLTree.AVLCursor(tree, tree.max_node())
+    seen = [cur.key()]
+    while cur.prev() is not None:
+        seen.append(cur.value())
+    assert seen[1:] == [str(k) for k in reversed(keys[:-1])]
+    print("✓ next and prev walk the keys in order")
+    
+    cur = tree.cursor()
+    for target in [random.randrange(-10, 5010) for i in range(2000)]:
+        found = cur.seek(target)
+        ceiling = [k for k in keys if k >= target]
+        assert cur.key() == (ceiling[0] if ceiling else None), f"Seek to {target}"
+        assert (found is not None) == (target in keys)
+        if not cur.valid():
+            cur = tree.cursor(target - 100)
+    print("✓ Seek lands on the ceiling from any position")
+    
+    # a seek to a neighbouring key only climbs as far as needed
+    node = tree.search(keys[400])[0]
+    total = 0
+    for k in keys[400:600]:
+        found, ceiling, edges = tree.seek_from(node, k)
+        assert found.key == k
+        total += edges
+        node = found
+    from_root = sum(tree.search(k)[1] for k in keys[400:600])
+    assert total < from_root * 0.6, f"Sequential seeks visited {total} nodes, {from_root} from the root"
+    node, edges = tree.finger_search(keys[-1])
+    assert node.key == keys[-1] and edges == 1
+    assert tree.finger_search(keys[-1] + 1) is None
+    assert tree.finger_search(keys[0] + 1) == (None, -1)
+    print(f"✓ Local seeks visited {total} nodes for 200 keys, {from_root} from the root")
+
+def test_min_pointer_and_two_sided_finger():
+    """Test the min pointer and fingers from both ends"""
+    print("\n" + "=" * 50)
+    print("TEST 28: Min Pointer and Two-Sided Finger")
+    print("=" * 50)
+    
+    n = 2000
+    up, down = AVLTree.AVLTree(), AVLTree.AVLTree()
+    up_edges = down_edges = 0
+    for i in range(n):
+        up_edges += up.finger_insert(i, str(i))[1]
+        down_edges += down.finger_insert(n - i, str(n - i))[1]
+    assert_valid_avl(up)
+    assert_valid_avl(down)
+    # descending input now reaches its end of the tree as cheaply as ascending input
+    assert down_edges <= up_edges * 1.1, f"descending {down_edges} vs ascending {up_edges}"
+    assert down.finger_search(1)[1] <= 2 and down.finger_search(n)[1] <= 2
+    assert down.finger_search(n // 2)[0].key == n // 2
+    assert down.finger_search(0) == (None, -1)
+    print(f"✓ Finger insert edges: ascending {up_edges}, descending {down_edges}")
+    
+    random.seed(21)
+    tree = AVLTree.AVLTree()
+    keys = set()
+    for step in range(3000):
+        k = random.randrange(500)
+        if k in keys and random.random() < 0.5:
+            tree.delete(tree.search(k)[0])
+            keys.discard(k)
+        elif k not in keys:
+            tree.finger_insert(k, str(k))
+            keys.add(k)
+        if step % 500 == 0:
+            assert_valid_avl(tree)
+    assert_valid_avl(tree)
+    left, found, right = tree.split_key(250)
+    assert_valid_avl(left)
+    assert_valid_avl(right)
+    left.join(right, 250, "250")
+    assert_valid_avl(left)
+    other = AVLTree.AVLTree.from_sorted([(k, str(k)) for k in range(300, 700)])
+    left.union(other)
+    assert_valid_avl(left)
+    print("✓ Min stays correct through deletes, split, join and union")
+
+def test_threaded():
+    """Test the threaded mode's next and prev links"""
+    print("\n" + "=" * 50)
+    print("TEST 29: Threaded Links")
+    print("=" * 50)
+    
+    def assert_threaded(tree):
+        assert_valid_avl(tree)
+        nodes = []
+        stack, node = [], tree.get_root()
+        while stack or (node is not None and node.is_real_node()):
+            while node is not None and node.is_real_node():
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            nodes.append(node)
+            node = node.right
+        for i, node in enumerate(nodes):
+            assert node.prev is (nodes[i - 1] if i > 0 else None), f"prev of {node.key}"
+            assert node.next is (nodes[i + 1] if i + 1 < len(nodes) else None), f"next of {node.key}"
+    
+    random.seed(22)
+    tree = AVLTree.AVLTree(threaded=True)
+    keys = set()
+    for step in range(3000):
+        k = random.randrange(500)
+        if k in keys and random.random() < 0.5:
+            tree.delete(tree.search(k)[0])
+            keys.discard(k)
+        elif k not in keys:
+            if step % 2:
+                tree.finger_insert(k, str(k))
+            else:
+                tree.insert(k, str(k))
+            keys.add(k)
+        if step % 500 == 0:
+            assert_threaded(tree)
+    assert_threaded(tree)
+    assert list(tree) == sorted(keys)
+    assert [k for k, v in tree.items(reverse=True)] == sorted(keys, reverse=True)
+    node = tree.search(min(keys))[0]
+    assert tree.successor(node) is node.next and tree.predecessor(node) is None
+    print("✓ Links follow inserts and deletes")
+    
+    left, found, right = tree.split_key(250)
+    assert_threaded(left)
+    assert_threaded(right)
+    left.join(right, 250, "250")
+    assert_threaded(left)
+    other = AVLTree.AVLTree.from_sorted([(k, str(k)) for k in range(300, 700)])
+    left.union(other)
+    assert_threaded(left)
+    assert other.size() == 0
+    expected = sorted(keys | {250} | set(range(300, 700)))
+    assert list(left) == expected
+    print("✓ Links survive split, join and union with a plain tree")
+    
+    for op in ("union", "intersection", "difference", "symmetric_difference"):
+        a_keys = set(random.sample(range(3000), 800))
+        b_keys = set(random.sample(range(3000), random.choice((5, 800))))
+        a = AVLTree.AVLTree.from_sorted([(k, k) for k in sorted(a_keys)], threaded=True)
+        b = AVLTree.AVLTree.from_sorted([(k, k) for k in sorted(b_keys)], threaded=True)
+        getattr(a, op)(b)
+        assert_threaded(a)
+        assert list(a) == sorted(getattr(a_keys, op)(b_keys)), op
+    batch = AVLTree.AVLTree(threaded=True)
+    batch.insert_many((k, k) for k in range(0, 2000, 2))
+    batch.insert_many((k, -k) for k in (3, 501, 1999, 2500, 4))
+    assert_threaded(batch)
+    assert batch.size() == 1004 and batch.search(4)[0].value == -4
+    
+    copy = pickle.loads(pickle.dumps(left))
+    assert copy.threaded
+    assert_threaded(copy)
+    cursor = copy.cursor(expected[10])
+    assert cursor.prev() and cursor.key() == expected[9]
+    assert cursor.next() and cursor.next() and cursor.key() == expected[11]
+    print("✓ Dump, load and cursors")
+
+def test_single_descent_updates():
+    """Test delete_key, pop, upsert and get_or_insert"""
+    print("\n" + "=" * 50)
+    print("TEST 30: Single Descent Updates")
+    print("=" * 50)
+    
+    random.seed(23)
+    for threaded in (False, True):
+        tree = AVLTree.AVLTree(size_augmented=True, threaded=threaded)
+        model = {}
+        for step in range(4000):
+            k = random.randrange(300)
+            r = random.random()
+            if r < 0.3:
+                node, inserted = tree.upsert(k, step)
+                assert inserted == (k not in model) and node.value == step
+                model[k] = step
+            elif r < 0.5:
+                node, inserted = tree.get_or_insert(k, lambda: -step)
+                assert inserted == (k not in model)
+                model.setdefault(k, -step)
+                assert node.value == model[k]
+            elif r < 0.75:
+                assert tree.delete_key(k) == (k in model)
+                model.pop(k, None)
+            else:
+                assert tree.pop(k, "missing") == model.pop(k, "missing")
+            if step % 500 == 0:
+                assert_valid_avl(tree)
+        assert_valid_avl(tree)
+        assert list(tree.items()) == sorted(model.items())
+    print("✓ Matches a dict model, plain and threaded")
+    
+    tree = AVLTree.AVLTree()
+    tree.enable_stats()
+    calls = []
+    assert tree.get_or_insert(1, lambda: calls.append(1) or "one") == (tree.search(1)[0], True)
+    assert tree.get_or_insert(1, lambda: calls.append(2) or "uno")[0].value == "one"
+    assert calls == [1], "The factory runs only when the key is inserted"
+    tree.upsert(2, "two")
+    tree.upsert(2, "deux")
+    assert tree.search(2)[0].value == "deux" and tree.size() == 2
+    assert tree.stats.inserts == 2
+    assert tree.pop(3) is None and not tree.delete_key(3)
+    print("✓ Factories, stats and missing keys")
+
+def test_delete_range():
+    """Test delete_range against a model"""
+    print("\n" + "=" * 50)
+    print("TEST 31: Delete Range")
+    print("=" * 50)
+    
+    random.seed(24)
+    for augmented, threaded in ((False, False), (True, False), (False, True)):
+        tree = AVLTree.AVLTree(size_augmented=augmented, threaded=threaded)
+        keys = set(random.sample(range(2000), 1200))
+        for k in keys:
+            tree.insert(k, str(k))
+        for step in range(40):
+            lo = random.randrange(-10, 2010)
+            hi = lo + random.randrange(-5, 150)
+            removed = tree.delete_range(lo, hi)
+            gone = sorted(k for k in keys if lo <= k < hi)
+            keys.difference_update(gone)
+            assert list(removed.items()) == [(k, str(k)) for k in gone]
+            assert removed.size() == len(gone) and tree.size() == len(keys)
+            assert_valid_avl(tree)
+            assert_valid_avl(removed)
+            assert list(tree) == sorted(keys)
+            for k in random.sample(range(2000), 5):
+                if k not in keys:
+                    tree.insert(k, str(k))
+                    keys.add(k)
+        assert_valid_avl(tree)
+    print("✓ Matches a set model in every mode")
+    
+    tree = AVLTree.AVLTree.from_sorted([(k, k) for k in range(100)])
+    assert tree.delete_range(50, 50).size() == 0 and tree.size() == 100
+    everything = tree.delete_range(-1, 1000)
+    assert everything.size() == 100 and tree.size() == 0 and tree.get_root() is None
+    assert_valid_avl(everything)
+    tree.insert(5, 5)
+    assert list(tree) == [5]
+    print("✓ Empty ranges and removing everything")
+
+def test_nearest_key_queries():
+    """Test floor, ceiling, lower, higher and nearest, from the root, the ends and a cursor"""
+    print("\n" + "=" * 50)
+    print("TEST 32: Nearest Key Queries")
+    print("=" * 50)
+    
+    def key_of(node):
+        return None if node is None else node.key
+    
+    random.seed(25)
+    for threaded in (False, True):
+        keys = sorted(random.sample(range(0, 3000, 3), 400))
+        tree = AVLTree.AVLTree(threaded=threaded)
+        for k in keys:
+            tree.insert(k, str(k))
+        cursor = tree.cursor()
+        for q in list(range(-5, 3005, 7)) + keys[:50]:
+            expected = {
+                "floor": max((k for k in keys if k <= q), default=None),
+                "ceiling": min((k for k in keys if k >= q), default=None),
+                "lower": max((k for k in keys if k < q), default=None),
+                "higher": min((k for k in keys if k > q), default=None),
+            }
+            for kind, want in expected.items():
+                assert key_of(getattr(tree, kind)(q)) == want, f"{kind}({q})"
+                assert key_of(getattr(tree, "finger_" + kind)(q)) == want, f"finger_{kind}({q})"
+                assert key_of(getattr(cursor, kind)(q)) == want, f"cursor {kind}({q})"
+            nearest = sorted(keys, key=lambda k: (abs(k - q), k))[:5]
+            assert [n.key for n in tree.nearest(q, 5)] == nearest, f"nearest({q})"
+            assert [n.key for n in tree.finger_nearest(q, 5)] == nearest
+    print("✓ Matches brute force, plain and threaded")
+    
+    empty = AVLTree.AVLTree()
+    assert empty.floor(1) is None and empty.finger_higher(1) is None
+    assert empty.nearest(1, 3) == [] and empty.cursor().floor(1) is None
+    tree = AVLTree.AVLTree.from_sorted([(k, k) for k in range(0, 100000, 10)])
+    tree.enable_stats()
+    tree.finger_floor(99985)
+    assert tree.stats.nodes_visited <= 6, "A key next to the max is found near the max"
+    assert [n.key for n in tree.nearest(55, 3)] == [50, 60, 40]
+    assert len(tree.nearest(5, 20000)) == 10000
+    print("✓ Empty trees, fingers and large k")
+
 def run_all_tests():
     """Run all tests"""
     print("\n\n" + "=" * 50)
@@ -388,6 +1161,24 @@ def run_all_tests():
         test_balance_after_deletions()
         test_duplicate_operations()
         test_finger_search()
+        test_shared_sentinel()
+        test_memory_usage()
+        test_rebalance_random()
+        test_iterators()
+        test_range()
+        test_from_sorted()
+        test_split_join()
+        test_insert_many()
+        test_select_rank()
+        test_set_operations()
+        test_dump_load()
+        test_stats()
+        test_cursor()
+        test_min_pointer_and_two_sided_finger()
+        test_threaded()
+        test_single_descent_updates()
+        test_delete_range()
+        test_nearest_key_queries()
         
         print("\n" + "=" * 50)
         print("✓✓✓ ALL TESTS PASSED! ✓✓✓")
@@ -0,0 +1,68 @@
+import random
+import AVLTree
+import AVLArrayTree
+
+def test_matches_pointer_tree():
+    """The array engine reports the same edges and promotes as AVLTree"""
+    print("=" * 50)
+    print("Array engine vs AVLTree")
+    print("=" * 50)
+    
+    random.seed(7)
+    keys = random.sample(range(1000), 300)
+    ptr = AVLTree.AVLTree()
+    arr = AVLArrayTree.AVLArrayTree()
+    for i, k in enumerate(keys):
+        if i % 2:
+            r1, r2 = ptr.insert(k, str(k)), arr.insert(k, str(k))
+        else:
+            r1, r2 = ptr.finger_insert(k, str(k)), arr.finger_insert(k, str(k))
+        assert r1[1:] == r2[1:], f"Insert of {k}: {r1[1:]} != {r2[1:]}"
+    assert arr.avl_to_array() == ptr.avl_to_array()
+    assert arr.size() == 300 and arr.key(arr.max_node()) == max(keys)
+    print("✓ Same edges, promotes and contents")
+
+def test_delete_and_free_list():
+    """Deleted slots are reused by later inserts"""
+    tree = AVLArrayTree.AVLArrayTree()
+    for i in range(50):
+        tree.insert(i, str(i))
+    for i in range(0, 50, 2):
+        tree.delete(tree.search(i)[0])
+    assert [k for k, v in tree.avl_to_array()] == list(range(1, 50, 2))
+    assert tree.key(tree.max_node()) == 49 and tree.key(tree.min_node()) == 1
+    slots = len(tree.store.keys)
+    for i in range(0, 50, 2):
+        tree.insert(i, str(i))
+    assert len(tree.store.keys) == slots, "Free slots should be reused"
+    assert tree.size() == 50
+    print("✓ Delete and free list")
+
+def test_split_join_copy():
+    """split, join and copy keep the dictionary intact"""
+    tree = AVLArrayTree.AVLArrayTree()
+    for i in range(100):
+        tree.finger_insert(i, str(i))
+    snapshot = tree.copy()
+    left, right = tree.split(tree.search(40)[0])
+    assert [k for k, v in left.avl_to_array()] == list(range(40))
+    assert [k for k, v in right.avl_to_array()] == list(range(41, 100))
+    assert left.size() == 40 and right.size() == 59
+    assert left.key(left.max_node()) == 39 and right.key(right.max_node()) == 99
+    left.join(right, 40, "40")
+    assert left.avl_to_array() == snapshot.avl_to_array()
+    assert left.size() == 100 and right.size() == 0
+    
+    other = AVLArrayTree.AVLArrayTree()
+    for i in range(200, 210):
+        other.insert(i, str(i))
+    left.join(other, 150, "150")
+    assert [k for k, v in left.avl_to_array()] == list(range(100)) + [150] + list(range(200, 210))
+    assert left.key(left.max_node()) == 209
+    print("✓ Split, join and copy")
+
+if __name__ == "__main__":
+    test_matches_pointer_tree()
+    test_delete_and_free_list()
+    test_split_join_copy()
+    print("All Tests Passed Successfully! ✓")
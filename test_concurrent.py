@@ -0,0 +1,70 @@
+import threading
+import ConcurrentAVLTree
+from comprehensive_test import assert_valid_avl
+
+def test_readers_share_the_lock():
+    """Two readers can hold the lock together, a writer waits for both"""
+    print("=" * 50)
+    print("Concurrent wrapper")
+    print("=" * 50)
+
+    lock = ConcurrentAVLTree.ReadWriteLock()
+    both_in = threading.Barrier(2, timeout=5)
+    events = []
+
+    def reader():
+        with lock.read_locked():
+            both_in.wait()
+            events.append("read")
+
+    def writer():
+        with lock.write_locked():
+            events.append("write")
+
+    readers = [threading.Thread(target=reader) for i in range(2)]
+    for t in readers:
+        t.start()
+    for t in readers:
+        t.join()
+    w = threading.Thread(target=writer)
+    w.start()
+    w.join()
+    assert events == ["read", "read", "write"]
+    print("✓ Readers share the lock")
+
+def test_threads_and_batches():
+    """Writes from many threads all land, batched writes wait for flush"""
+    tree = ConcurrentAVLTree.ConcurrentAVLTree()
+
+    def work(t):
+        for i in range(200):
+            tree.insert(t * 1000 + i, str(i))
+            tree.get(t * 1000 + i // 2)
+            if i % 3 == 0:
+                tree.delete(t * 1000 + i)
+            if i % 50 == 0:
+                tree.range(t * 1000, t * 1000 + 10)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    expected = sorted(t * 1000 + i for t in range(6) for i in range(200) if i % 3)
+    assert list(tree) == expected and tree.size() == len(expected)
+    assert_valid_avl(tree.tree)
+
+    batched = ConcurrentAVLTree.ConcurrentAVLTree(batch_size=10)
+    for i in range(9):
+        batched.insert(i, str(i))
+    assert batched.size() == 0 and not batched.contains(3)
+    batched.insert(3, "three")
+    assert batched.size() == 9 and batched.get(3) == "three"
+    batched.delete(0)
+    assert batched.flush() == 1 and batched.get(0, "none") == "none"
+    print("✓ Threads and batches")
+
+if __name__ == "__main__":
+    test_readers_share_the_lock()
+    test_threads_and_batches()
+    print("All Tests Passed Successfully! ✓")
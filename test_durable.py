@@ -0,0 +1,67 @@
+import os
+import tempfile
+import DurableAVLTree
+from comprehensive_test import assert_valid_avl
+
+def test_recovery_from_log_and_snapshot():
+    """A reopened tree holds every synced write"""
+    print("=" * 50)
+    print("Durable tree")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as d:
+        with DurableAVLTree.DurableAVLTree(d, fsync_batch=8, compact_every=150) as tree:
+            for i in range(400):
+                if i % 2:
+                    tree.insert(i, str(i))
+                else:
+                    tree.finger_insert(i, str(i))
+            for i in range(0, 400, 3):
+                tree.delete(tree.search(i)[0])
+            expected = tree.avl_to_array()
+        assert os.path.exists(os.path.join(d, DurableAVLTree.SNAPSHOT_NAME))
+        with DurableAVLTree.DurableAVLTree(d) as reopened:
+            assert reopened.log_records > 0, "The log tail should be replayed over the snapshot"
+            assert reopened.avl_to_array() == expected
+            assert_valid_avl(reopened.tree)
+        with DurableAVLTree.DurableAVLTree(d, size_augmented=True) as augmented:
+            assert augmented.tree.augmented and augmented.avl_to_array() == expected
+            assert augmented.tree.select(3).key == expected[3][0]
+    print("✓ Snapshot plus log tail")
+
+def test_torn_tail_and_group_commit():
+    """Unsynced records are lost, a torn record is cut off"""
+    with tempfile.TemporaryDirectory() as d:
+        tree = DurableAVLTree.DurableAVLTree(d, fsync_batch=4)
+        for i in range(10):
+            tree.insert(i, str(i))
+        # a crash here: 8 records synced, 2 still buffered
+        tree.log.close()
+        log_path = os.path.join(d, DurableAVLTree.LOG_NAME)
+        with open(log_path, "ab") as f:
+            f.write(DurableAVLTree.encode_record(DurableAVLTree.OP_INSERT, 99, "99")[:-3])
+        size = os.path.getsize(log_path)
+        with DurableAVLTree.DurableAVLTree(d) as tree:
+            assert list(tree) == list(range(8))
+            assert os.path.getsize(log_path) < size
+            tree.insert(8, "again")
+        with DurableAVLTree.DurableAVLTree(d) as tree:
+            assert tree.search(8)[0].value == "again"
+    print("✓ Group commit and torn tail")
+
+def test_sync_interval():
+    """A write after sync_interval syncs the records buffered before it"""
+    with tempfile.TemporaryDirectory() as d:
+        with DurableAVLTree.DurableAVLTree(d, fsync_batch=1000, sync_interval=0) as tree:
+            tree.insert(1, "1")
+            assert tree.pending == []
+        with DurableAVLTree.DurableAVLTree(d, fsync_batch=1000, sync_interval=3600) as tree:
+            tree.insert(2, "2")
+            assert len(tree.pending) == 1
+    print("✓ Sync interval")
+
+if __name__ == "__main__":
+    test_recovery_from_log_and_snapshot()
+    test_torn_tail_and_group_commit()
+    test_sync_interval()
+    print("All Tests Passed Successfully! ✓")
@@ -0,0 +1,102 @@
+import random
+import PersistentAVLTree
+
+def assert_valid(tree):
+    """Check order, heights, sizes and balance of every node"""
+    stack = [(tree.root, None, None)]
+    while stack:
+        node, lo, hi = stack.pop()
+        if node is None:
+            continue
+        assert (lo is None or node.key > lo) and (hi is None or node.key < hi), f"Key {node.key} out of order"
+        hl, hr = PersistentAVLTree.height(node.left), PersistentAVLTree.height(node.right)
+        assert node.height == max(hl, hr) + 1, f"Bad height at {node.key}"
+        assert abs(hl - hr) <= 1, f"Unbalanced at {node.key}"
+        assert node.size == PersistentAVLTree.size(node.left) + PersistentAVLTree.size(node.right) + 1
+        stack.append((node.left, lo, node.key))
+        stack.append((node.right, node.key, hi))
+
+def test_versions_stay_valid():
+    """Every old version keeps its contents after later updates"""
+    print("=" * 50)
+    print("Persistent versions")
+    print("=" * 50)
+
+    random.seed(13)
+    tree = PersistentAVLTree.PersistentAVLTree()
+    model = {}
+    versions = [(tree, dict(model))]
+    for i in range(2000):
+        k = random.randrange(500)
+        if random.random() < 0.35:
+            tree = tree.delete(k)
+            model.pop(k, None)
+        else:
+            tree = tree.insert(k, str(i))
+            model[k] = str(i)
+        if i % 100 == 0:
+            versions.append((tree, dict(model)))
+    versions.append((tree, model))
+    for version, expected in versions:
+        assert_valid(version)
+        assert version.avl_to_array() == sorted(expected.items())
+        assert version.size() == len(expected)
+    node, edges = tree.search(max(model))
+    assert node is tree.max_node() and edges >= 1
+    assert tree.search(-1) == (None, -1)
+    print("✓ Old versions unchanged")
+
+def test_path_copying():
+    """An insert copies only its search path, the rest is shared"""
+    tree = PersistentAVLTree.PersistentAVLTree()
+    for i in range(1024):
+        tree = tree.insert(i, str(i))
+    newer = tree.insert(2000, "2000")
+
+    def nodes(version):
+        stack, seen = [version.root], set()
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                seen.add(id(node))
+                stack += [node.left, node.right]
+        return seen
+    assert len(nodes(newer) - nodes(tree)) <= newer.root.height + 2
+    assert tree.snapshot() is tree and tree.size() == 1024
+    print("✓ Path copying")
+
+def test_split_join():
+    """split and join make new versions and leave the original intact"""
+    tree = PersistentAVLTree.PersistentAVLTree()
+    for i in range(300):
+        tree = tree.insert(i, str(i))
+    left, node, right = tree.split(120)
+    assert_valid(left)
+    assert_valid(right)
+    assert node.key == 120
+    assert list(left) == list(range(120)) and list(right) == list(range(121, 300))
+    joined = left.join(right, 120, "x")
+    assert_valid(joined)
+    assert list(joined) == list(range(300)) and joined.search(120)[0].value == "x"
+    assert list(right.join(left, 120, "y")) == list(range(300))
+    assert tree.search(120)[0].value == "120" and tree.size() == 300
+    left, node, right = tree.split(1000)
+    assert node is None and left.size() == 300 and right.size() == 0
+    small = PersistentAVLTree.PersistentAVLTree().insert(5000, "5000")
+    tall = tree.join(small, 4000, "4000")
+    assert_valid(tall)
+    assert list(tall.range(250, 4001)) == [(k, str(k)) for k in range(250, 300)] + [(4000, "4000")]
+    empty = PersistentAVLTree.PersistentAVLTree()
+    low = empty.insert(1, "1").insert(2, "2")
+    high = empty.insert(8, "8").insert(9, "9")
+    for joined in (empty.join(low, 5, "5"), empty.join(high, 5, "5"), low.join(empty, 5, "5"), high.join(empty, 5, "5")):
+        assert_valid(joined)
+    assert list(empty.join(low, 5, "5")) == [1, 2, 5]
+    assert list(empty.join(high, 5, "5")) == [5, 8, 9]
+    print("✓ Split and join")
+
+if __name__ == "__main__":
+    test_versions_stay_valid()
+    test_path_copying()
+    test_split_join()
+    print("All Tests Passed Successfully! ✓")
@@ -0,0 +1,62 @@
+import cProfile
+import AVLTree
+import AVLProfiling
+
+def test_histogram_buckets():
+    """Every value falls in a bucket whose bounds are within 1/8 of it"""
+    print("=" * 50)
+    print("Latency histograms")
+    print("=" * 50)
+
+    h = AVLProfiling.LatencyHistogram()
+    for ns in list(range(100)) + [1000, 12345, 10 ** 6, 10 ** 9 + 7]:
+        bucket = h.bucket_of(ns)
+        high = h.bucket_high(bucket)
+        assert ns <= high <= ns + ns // 8, f"{ns} in bucket up to {high}"
+        assert bucket == 0 or h.bucket_high(bucket - 1) < ns
+    for ns in range(1, 1001):
+        h.record(ns * 1000)
+    assert h.count == 1000 and h.max == 10 ** 6 and h.min == 1000
+    p50 = h.percentile(50)
+    assert 500000 <= p50 <= 500000 * 9 // 8
+    assert h.percentile(100) == h.max
+    other = AVLProfiling.LatencyHistogram()
+    other.record(5)
+    h.merge(other)
+    assert h.count == 1001 and h.min == 5
+    print("✓ Log buckets and percentiles")
+
+def test_instrument_tree():
+    """Instrumented calls are timed, slow ones reported, and it can be removed"""
+    tree = AVLTree.AVLTree()
+    slow = []
+    profiler = cProfile.Profile()
+    inst = AVLProfiling.instrument(tree, slow_ms=0, on_slow=lambda op, ns, args, kwargs: slow.append(op),
+        profiler=profiler, sample_every=10)
+    for i in range(50):
+        tree.insert(i, str(i))
+    for i in range(50, 59):
+        tree.finger_insert(i, str(i))
+    tree.finger_insert(key=59, val="59")
+    tree.delete(tree.search(20)[0])
+    left, right = tree.split(tree.search(30)[0])
+    left.join(right, 30, "30")
+    report = inst.snapshot()
+    assert report["insert"]["count"] == 50 and report["finger_insert"]["count"] == 10
+    assert report["search"]["count"] == 2 and report["delete"]["count"] == 1
+    assert report["split"]["count"] == 1 and report["insert"]["max"] > 0
+    # the halves made by split carry on with the same instrumentation
+    assert report["join"]["count"] == 1 and left.instrumentation is inst
+    assert len(slow) == inst.calls == 65
+    assert profiler.getstats(), "The sampled calls should be profiled"
+
+    assert AVLProfiling.uninstrument(tree) is inst
+    assert "insert" not in tree.__dict__ and not hasattr(tree, "instrumentation")
+    tree.insert(100, "100")
+    assert inst.snapshot()["insert"]["count"] == 50
+    print("✓ Instrumented tree")
+
+if __name__ == "__main__":
+    test_histogram_buckets()
+    test_instrument_tree()
+    print("All Tests Passed Successfully! ✓")